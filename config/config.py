@@ -3,6 +3,115 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+#TMDB API
+TMDB_API_KEY =os.getenv('TMDB_API_KEY')
+TMDB_BASE_URL = 'https://api.themoviedb.org/3'
+
+# TMDB request pacing (TMDB allows roughly 40 requests per 10 seconds)
+TMDB_MAX_WORKERS = int(os.getenv('TMDB_MAX_WORKERS', '8'))
+TMDB_REQUESTS_PER_SECOND = float(os.getenv('TMDB_REQUESTS_PER_SECOND', '4'))
+TMDB_BURST = int(os.getenv('TMDB_BURST', '40'))
+TMDB_POPULAR_PAGES = int(os.getenv('TMDB_POPULAR_PAGES', '3'))
+
+# Sub-resources fetched in the same /movie/{id} call via append_to_response
+TMDB_APPEND_TO_RESPONSE = os.getenv('TMDB_APPEND_TO_RESPONSE', 'credits,release_dates,keywords,external_ids')
+
+# Keep responses as slotted records of the loaded fields instead of full dicts.
+# The raw archive then stores the same trimmed payloads.
+TMDB_COMPACT_RECORDS = os.getenv('TMDB_COMPACT_RECORDS', 'true').lower() == 'true'
+
+# TMDB HTTP session (keep-alive pool, timeouts in seconds, retry backoff)
+TMDB_POOL_SIZE = int(os.getenv('TMDB_POOL_SIZE', str(TMDB_MAX_WORKERS)))
+TMDB_CONNECT_TIMEOUT = float(os.getenv('TMDB_CONNECT_TIMEOUT', '3.05'))
+TMDB_READ_TIMEOUT = float(os.getenv('TMDB_READ_TIMEOUT', '10'))
+TMDB_MAX_RETRIES = int(os.getenv('TMDB_MAX_RETRIES', '4'))
+TMDB_BACKOFF_BASE = float(os.getenv('TMDB_BACKOFF_BASE', '0.5'))
+TMDB_BACKOFF_MAX = float(os.getenv('TMDB_BACKOFF_MAX', '20'))
+
+# Optional on-disk TMDB response cache (disabled when TMDB_CACHE_DIR is empty)
+TMDB_CACHE_DIR = os.getenv('TMDB_CACHE_DIR', '')
+TMDB_CACHE_MAX_BYTES = int(os.getenv('TMDB_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+TMDB_CACHE_TTLS = {
+    '/movie/{id}' : int(os.getenv('TMDB_DETAILS_CACHE_TTL', '21600'))
+}
+
+# Incremental extraction: only re-fetch details for changed or newly popular movies
+INCREMENTAL_EXTRACT = os.getenv('INCREMENTAL_EXTRACT', 'false').lower() == 'true'
+EXTRACT_STATE_KEY = os.getenv('EXTRACT_STATE_KEY', 'state/extract_state.json')
+TMDB_CHANGES_MAX_DAYS = 14
+
+# Streaming pipeline: movies per batch and how many batches may wait for the loader
+STREAM_PIPELINE = os.getenv('STREAM_PIPELINE', 'false').lower() == 'true'
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', '20'))
+STREAM_PREFETCH = int(os.getenv('STREAM_PREFETCH', '2'))
+
+# Deadline-aware runs: stop taking new work this long before the Lambda timeout
+# and leave a cursor so the next invocation continues (stale cursors are dropped)
+DEADLINE_SAFETY_MS = int(os.getenv('DEADLINE_SAFETY_MS', '30000'))
+PIPELINE_CURSOR_KEY = os.getenv('PIPELINE_CURSOR_KEY', 'state/pipeline_cursor.json')
+PIPELINE_CURSOR_MAX_AGE_HOURS = int(os.getenv('PIPELINE_CURSOR_MAX_AGE_HOURS', '6'))
+
+#AWS Configuration
+S3_BUCKET = os.getenv("S3_BUCKET")
+
+# Raw archive: compressed NDJSON under raw-data/dt=YYYY-MM-DD/hour=HH/
+RAW_ARCHIVE_PREFIX = os.getenv('RAW_ARCHIVE_PREFIX', 'raw-data')
+RAW_ARCHIVE_COMPRESSION = os.getenv('RAW_ARCHIVE_COMPRESSION', 'gzip')
+RAW_ARCHIVE_PART_SIZE = int(os.getenv('RAW_ARCHIVE_PART_SIZE', str(8 * 1024 * 1024)))
+
+# Local directory standing in for the S3 bucket (compaction/replay), and compacted output
+RAW_LOCAL_DIR = os.getenv('RAW_LOCAL_DIR', '')
+COMPACTED_PREFIX = os.getenv('COMPACTED_PREFIX', 'compacted')
+
+# Coordinator/worker fan-out: workers extract+transform a shard, the coordinator loads.
+# The 'lambda' backend invokes this function in worker mode; 'local' uses a process pool.
+FANOUT_BACKEND = os.getenv('FANOUT_BACKEND', 'lambda')
+FANOUT_FUNCTION_NAME = os.getenv('FANOUT_FUNCTION_NAME', os.getenv('AWS_LAMBDA_FUNCTION_NAME', ''))
+FANOUT_MAX_CONCURRENCY = int(os.getenv('FANOUT_MAX_CONCURRENCY', '4'))
+FANOUT_PAGES_PER_SHARD = int(os.getenv('FANOUT_PAGES_PER_SHARD', '1'))
+FANOUT_IDS_PER_SHARD = int(os.getenv('FANOUT_IDS_PER_SHARD', '50'))
+
+# Full-catalog crawl from TMDB's daily ID exports
+TMDB_EXPORTS_URL = 'http://files.tmdb.org/p/exports'
+CRAWL_PREFIX = os.getenv('CRAWL_PREFIX', 'crawl')
+CRAWL_SHARD_SIZE = int(os.getenv('CRAWL_SHARD_SIZE', '500'))
+CRAWL_SHARDS_PER_RUN = int(os.getenv('CRAWL_SHARDS_PER_RUN', '2'))
+CRAWL_MIN_POPULARITY = float(os.getenv('CRAWL_MIN_POPULARITY', '0'))
+
+# Skip reloading movies whose content fingerprint hasn't changed
+CHANGE_DETECTION = os.getenv('CHANGE_DETECTION', 'true').lower() == 'true'
+
+# Maintain movie_metrics (ROI, profit, day-over-day deltas, rank movement) after each load
+DERIVED_METRICS = os.getenv('DERIVED_METRICS', 'true').lower() == 'true'
+
+# Maintain genre_daily_stats and daily_summary (the dashboard's per-snapshot rollups) after each load
+# The dashboard reads the same setting: with it off, its genre and trend charts query daily_stats
+DASHBOARD_AGGREGATES = os.getenv('DASHBOARD_AGGREGATES', 'true').lower() == 'true'
+
+# Loads of at least this many rows per table go through COPY into a staging table
+COPY_THRESHOLD = int(os.getenv('COPY_THRESHOLD', '5000'))
+
+# tmdb id -> surrogate id entries kept per dimension (movies, genres) by a warm process
+KEY_CACHE_SIZE = int(os.getenv('KEY_CACHE_SIZE', '100000'))
+
+# 'reuse' keeps the database connection open across warm invocations; 'pooler' opens one
+# per run and leaves pooling to PgBouncer or RDS Proxy in front of the database
+DB_CONNECTION_MODE = os.getenv('DB_CONNECTION_MODE', 'reuse').lower()
+
+# A reused connection idle for longer than this is pinged before it's handed out
+DB_VALIDATE_AFTER_SECONDS = int(os.getenv('DB_VALIDATE_AFTER_SECONDS', '30'))
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '10'))
+
+# Append each live run's stats to hourly_stats and roll the day up into daily_stats
+HOURLY_STATS = os.getenv('HOURLY_STATS', 'true').lower() == 'true'
+
+# Monthly range partitions for daily_stats, created by the loader this many months ahead.
+# Partitions older than the retention window are archived as NDJSON and dropped (0 keeps all).
+DAILY_STATS_PARTITIONING = os.getenv('DAILY_STATS_PARTITIONING', 'false').lower() == 'true'
+DAILY_STATS_PARTITIONS_AHEAD = int(os.getenv('DAILY_STATS_PARTITIONS_AHEAD', '2'))
+DAILY_STATS_RETENTION_MONTHS = int(os.getenv('DAILY_STATS_RETENTION_MONTHS', '0'))
+DAILY_STATS_ARCHIVE_PREFIX = os.getenv('DAILY_STATS_ARCHIVE_PREFIX', 'archive/daily_stats')
+
 # Database Configuration
 DB_CONFIG = {
     'host' : os.getenv('DB_HOST', 'localhost'),
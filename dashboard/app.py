@@ -9,6 +9,7 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import psycopg2
 from config.config import DB_CONFIG
+from dashboard.queries import TOP_MOVIES_QUERY, GENRE_QUERY, TREND_QUERY, MOVERS_QUERY
 
 # Page configuration
 st.set_page_config(
@@ -27,63 +28,13 @@ def load_data():
     """Load data from database"""
     conn = get_database_connection()
     
-    # Top movies query
-    top_movies_query = """
-        SELECT 
-            m.title,
-            m.release_date,
-            ds.popularity,
-            ds.vote_average,
-            ds.vote_count,
-            m.revenue,
-            m.budget,
-            CASE 
-                WHEN m.poster_path IS NOT NULL 
-                THEN 'https://image.tmdb.org/t/p/w500' || m.poster_path 
-                ELSE NULL 
-            END as poster_url
-        FROM movies m
-        JOIN daily_stats ds ON m.id = ds.movie_id
-        WHERE ds.date = (SELECT MAX(date) FROM daily_stats)
-        ORDER BY ds.popularity DESC
-        LIMIT 20
-    """
-    
-    top_movies = pd.read_sql(top_movies_query, conn)
-    
-    # Genre popularity query
-    genre_query = """
-        SELECT 
-            g.name as genre,
-            AVG(ds.popularity) as avg_popularity,
-            COUNT(*) as movie_count
-        FROM genres g
-        JOIN movie_genres mg ON g.id = mg.genre_id
-        JOIN movies m ON mg.movie_id = m.id
-        JOIN daily_stats ds ON m.id = ds.movie_id
-        WHERE ds.date = (SELECT MAX(date) FROM daily_stats)
-        GROUP BY g.name
-        ORDER BY avg_popularity DESC
-    """
-    
-    genre_data = pd.read_sql(genre_query, conn)
-    
-    # Ratings trend (last 7 days if available)
-    trend_query = """
-        SELECT 
-            ds.date,
-            AVG(ds.vote_average) as avg_rating,
-            AVG(ds.popularity) as avg_popularity
-        FROM daily_stats ds
-        WHERE ds.date >= CURRENT_DATE - INTERVAL '7 days'
-        GROUP BY ds.date
-        ORDER BY ds.date
-    """
-    
-    trend_data = pd.read_sql(trend_query, conn)
+    top_movies = pd.read_sql(TOP_MOVIES_QUERY, conn)
+    genre_data = pd.read_sql(GENRE_QUERY, conn)
+    trend_data = pd.read_sql(TREND_QUERY, conn)
+    movers_data = pd.read_sql(MOVERS_QUERY, conn)
     
     conn.close()
-    return top_movies, genre_data, trend_data
+    return top_movies, genre_data, trend_data, movers_data
 
 def main():
     # Header
@@ -92,7 +43,7 @@ def main():
     
     # Load data
     try:
-        top_movies, genre_data, trend_data = load_data()
+        top_movies, genre_data, trend_data, movers_data = load_data()
     except Exception as e:
         st.error(f"Error loading data: {e}")
         st.stop()
@@ -110,7 +61,8 @@ def main():
     
     with col3:
         total_revenue = top_movies['revenue'].sum()
-        st.metric("Total Revenue", f"${total_revenue/1e9:.1f}B")
+        total_profit = top_movies['profit'].sum()
+        st.metric("Total Revenue", f"${total_revenue/1e9:.1f}B", f"${total_profit/1e9:.1f}B profit")
     
     with col4:
         avg_popularity = top_movies['popularity'].mean()
@@ -180,13 +132,33 @@ def main():
         
         st.plotly_chart(fig_trend, use_container_width=True)
     
+    # Rank movers section
+    if not movers_data.empty:
+        st.subheader("🚀 Biggest Movers Since Last Snapshot")
+
+        fig_movers = px.bar(
+            movers_data,
+            x='rank_change',
+            y='title',
+            orientation='h',
+            color='rank_change',
+            color_continuous_scale='RdYlGn',
+            hover_data=['popularity_rank', 'popularity_delta'],
+            title="Popularity Rank Change"
+        )
+        fig_movers.update_layout(height=400, yaxis={'categoryorder': 'total ascending'})
+        st.plotly_chart(fig_movers, use_container_width=True)
+
     # Movie details table
     st.subheader("🎬 Movie Details")
     
     # Display table with selected columns
-    display_df = top_movies[['title', 'release_date', 'vote_average', 'popularity', 'revenue']].copy()
+    display_df = top_movies[['title', 'release_date', 'vote_average', 'popularity', 'revenue', 'profit', 'roi', 'rank_change']].copy()
     display_df['revenue'] = display_df['revenue'].apply(lambda x: f"${x/1e6:.1f}M" if x > 0 else "N/A")
-    display_df.columns = ['Title', 'Release Date', 'Rating', 'Popularity', 'Revenue']
+    display_df['profit'] = display_df['profit'].apply(lambda x: f"${x/1e6:.1f}M" if pd.notna(x) else "N/A")
+    display_df['roi'] = display_df['roi'].apply(lambda x: f"{float(x):.0%}" if pd.notna(x) else "N/A")
+    display_df['rank_change'] = display_df['rank_change'].apply(lambda x: f"{int(x):+d}" if pd.notna(x) else "new")
+    display_df.columns = ['Title', 'Release Date', 'Rating', 'Popularity', 'Revenue', 'Profit', 'ROI', 'Rank Change']
     
     st.dataframe(display_df, use_container_width=True)
     
@@ -0,0 +1,104 @@
+# Dashboard SQL, shared with the ETL's EXPLAIN check (etl/migrations.py)
+
+from config.config import DASHBOARD_AGGREGATES
+
+# Top movies of the latest snapshot
+TOP_MOVIES_QUERY = """
+    SELECT
+        m.title,
+        m.release_date,
+        ds.popularity,
+        ds.vote_average,
+        ds.vote_count,
+        m.revenue,
+        m.budget,
+        mm.profit,
+        mm.roi,
+        mm.popularity_delta,
+        mm.rank_change,
+        CASE
+            WHEN m.poster_path IS NOT NULL
+            THEN 'https://image.tmdb.org/t/p/w500' || m.poster_path
+            ELSE NULL
+        END as poster_url
+    FROM movies m
+    JOIN daily_stats ds ON m.id = ds.movie_id
+    LEFT JOIN movie_metrics mm ON mm.movie_id = ds.movie_id AND mm.date = ds.date
+    WHERE ds.date = (SELECT MAX(date) FROM daily_stats)
+    ORDER BY ds.popularity DESC
+    LIMIT 20
+"""
+
+# Genre popularity of the latest snapshot, pre-aggregated by the ETL
+GENRE_AGGREGATE_QUERY = """
+    SELECT
+        g.name as genre,
+        gds.avg_popularity,
+        gds.movie_count
+    FROM genre_daily_stats gds
+    JOIN genres g ON g.id = gds.genre_id
+    WHERE gds.date = (SELECT MAX(date) FROM genre_daily_stats)
+    ORDER BY gds.avg_popularity DESC
+"""
+
+# The same, computed from daily_stats when the ETL doesn't maintain the aggregates
+GENRE_JOIN_QUERY = """
+    SELECT
+        g.name as genre,
+        AVG(ds.popularity) as avg_popularity,
+        COUNT(*) as movie_count
+    FROM genres g
+    JOIN movie_genres mg ON g.id = mg.genre_id
+    JOIN daily_stats ds ON mg.movie_id = ds.movie_id
+    WHERE ds.date = (SELECT MAX(date) FROM daily_stats)
+    GROUP BY g.name
+    ORDER BY avg_popularity DESC
+"""
+
+# Ratings trend (last 7 days if available), pre-aggregated by the ETL
+TREND_AGGREGATE_QUERY = """
+    SELECT
+        date,
+        avg_rating,
+        avg_popularity
+    FROM daily_summary
+    WHERE date >= CURRENT_DATE - INTERVAL '7 days'
+    ORDER BY date
+"""
+
+TREND_JOIN_QUERY = """
+    SELECT
+        ds.date,
+        AVG(ds.vote_average) as avg_rating,
+        AVG(ds.popularity) as avg_popularity
+    FROM daily_stats ds
+    WHERE ds.date >= CURRENT_DATE - INTERVAL '7 days'
+    GROUP BY ds.date
+    ORDER BY ds.date
+"""
+
+# Read the aggregates only while the ETL keeps them current (DASHBOARD_AGGREGATES)
+GENRE_QUERY = GENRE_AGGREGATE_QUERY if DASHBOARD_AGGREGATES else GENRE_JOIN_QUERY
+TREND_QUERY = TREND_AGGREGATE_QUERY if DASHBOARD_AGGREGATES else TREND_JOIN_QUERY
+
+# Biggest rank movements, precomputed by the ETL in movie_metrics
+MOVERS_QUERY = """
+    SELECT
+        m.title,
+        mm.popularity_rank,
+        mm.rank_change,
+        mm.popularity_delta
+    FROM movie_metrics mm
+    JOIN movies m ON m.id = mm.movie_id
+    WHERE mm.date = (SELECT MAX(date) FROM movie_metrics)
+      AND mm.rank_change IS NOT NULL
+    ORDER BY ABS(mm.rank_change) DESC, mm.popularity_rank
+    LIMIT 10
+"""
+
+DASHBOARD_QUERIES = {
+    'top_movies' : TOP_MOVIES_QUERY,
+    'genres' : GENRE_QUERY,
+    'trend' : TREND_QUERY,
+    'movers' : MOVERS_QUERY
+}
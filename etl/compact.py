@@ -0,0 +1,154 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import io
+import json
+from datetime import date, datetime, timedelta
+from config.config import RAW_ARCHIVE_PREFIX, COMPACTED_PREFIX
+from raw_store import open_raw_store, is_raw_archive, is_crawl_archive, decode_records
+from transform import MovieDataTransformer, transform_data
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+def table_schemas():
+    '''Parquet schemas matching MovieDataTransformer's output tables'''
+    return {
+        'movies' : pa.schema([
+            ('tmdb_id', pa.int64()), ('title', pa.string()), ('release_date', pa.date32()),
+            ('overview', pa.string()), ('poster_path', pa.string()), ('backdrop_path', pa.string()),
+            ('original_language', pa.string()), ('runtime', pa.int32()),
+            ('budget', pa.int64()), ('revenue', pa.int64())
+        ]),
+        'genres' : pa.schema([('tmdb_genre_id', pa.int32()), ('name', pa.string())]),
+        'movie_genres' : pa.schema([('tmdb_movie_id', pa.int64()), ('tmdb_genre_id', pa.int32())]),
+        'daily_stats' : pa.schema([
+            ('tmdb_movie_id', pa.int64()), ('date', pa.date32()), ('popularity', pa.float64()),
+            ('vote_average', pa.float64()), ('vote_count', pa.int32())
+        ]),
+        'credits' : pa.schema([
+            ('tmdb_movie_id', pa.int64()), ('tmdb_person_id', pa.int64()), ('name', pa.string()),
+            ('credit_type', pa.string()), ('role', pa.string()), ('credit_order', pa.int32())
+        ]),
+        'release_dates' : pa.schema([
+            ('tmdb_movie_id', pa.int64()), ('country', pa.string()), ('release_type', pa.int8()),
+            ('release_date', pa.date32()), ('certification', pa.string())
+        ]),
+        'keywords' : pa.schema([
+            ('tmdb_movie_id', pa.int64()), ('tmdb_keyword_id', pa.int64()), ('name', pa.string())
+        ]),
+        'external_ids' : pa.schema([
+            ('tmdb_movie_id', pa.int64()), ('imdb_id', pa.string()), ('wikidata_id', pa.string()),
+            ('facebook_id', pa.string()), ('instagram_id', pa.string()), ('twitter_id', pa.string())
+        ])
+    }
+
+def to_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(value) if value else None
+
+class RawZoneCompactor:
+    def __init__(self, store=None):
+        if pa is None:
+            raise RuntimeError("pyarrow is required for raw-zone compaction")
+        self.store = store or open_raw_store()
+        self.schemas = table_schemas()
+
+    def marker_key(self, day):
+        return f"{COMPACTED_PREFIX}/dt={day.isoformat()}/_SUCCESS.json"
+
+    def read_day(self, day):
+        '''Return the latest detail payload and latest stats record per movie for a day'''
+        details, latest, sources = {}, {}, []
+
+        # Keys sort by hour, so later snapshots overwrite earlier ones
+        for key in self.store.list_keys(f"{RAW_ARCHIVE_PREFIX}/dt={day.isoformat()}/"):
+            if not is_raw_archive(key):
+                continue
+            sources.append(key)
+            # Crawled catalog movies contribute their details, not stats (as when they were loaded)
+            crawled = is_crawl_archive(key)
+            for movie in decode_records(key, self.store.read(key)):
+                if not crawled:
+                    latest[movie['id']] = movie
+                if not movie.get('stats_only'):
+                    details[movie['id']] = movie
+
+        return list(details.values()), list(latest.values()), sources
+
+    def to_parquet(self, name, rows):
+        '''Serialise transformer rows to Parquet bytes using the typed schema'''
+        schema = self.schemas[name]
+        date_columns = [field.name for field in schema if pa.types.is_date32(field.type)]
+        if date_columns:
+            rows = [dict(row, **{c: to_date(row[c]) for c in date_columns}) for row in rows]
+
+        buffer = io.BytesIO()
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), buffer, compression='zstd')
+        return buffer.getvalue()
+
+    def compact_day(self, day, force=False):
+        '''Merge one day's raw objects into one Parquet file per table'''
+        if not force and self.store.exists(self.marker_key(day)):
+            print(f"Skipping {day}: already compacted")
+            return None
+
+        details, latest, sources = self.read_day(day)
+        if not sources:
+            print(f"Skipping {day}: no raw objects")
+            return None
+
+        tables = transform_data(details, snapshot_date=day)
+        tables['daily_stats'] = MovieDataTransformer().transform_daily_stats(latest, day)
+
+        counts = {}
+        for name, rows in tables.items():
+            if name not in self.schemas:
+                continue
+            key = f"{COMPACTED_PREFIX}/dt={day.isoformat()}/{name}.parquet"
+            self.store.write(key, self.to_parquet(name, rows))
+            counts[name] = len(rows)
+
+        # The marker goes last so a half-written partition is redone next time
+        manifest = {
+            'compacted_at' : datetime.now().isoformat(),
+            'sources' : sources,
+            'row_counts' : counts
+        }
+        self.store.write(self.marker_key(day), json.dumps(manifest, indent=2).encode('utf-8'))
+        print(f"Compacted {len(sources)} raw objects for {day}: {counts}")
+        return counts
+
+def compact_data(start_date, end_date=None, store=None, force=False):
+    '''Compact every finished day in [start_date, end_date]'''
+    compactor = RawZoneCompactor(store)
+    end_date = end_date or start_date
+    results = {}
+
+    day = start_date
+    while day <= end_date:
+        if day >= date.today() and not force:
+            # Today's partition is still receiving hourly objects
+            print(f"Skipping {day}: day not finished")
+        else:
+            results[day.isoformat()] = compactor.compact_day(day, force)
+        day += timedelta(days=1)
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compact raw JSON archives into Parquet')
+    parser.add_argument('start_date', type=date.fromisoformat)
+    parser.add_argument('end_date', type=date.fromisoformat, nargs='?')
+    parser.add_argument('--local-dir', help='directory standing in for the S3 bucket')
+    parser.add_argument('--force', action='store_true', help='recompact finished partitions')
+    args = parser.parse_args()
+
+    store = open_raw_store(args.local_dir) if args.local_dir else None
+    compact_data(args.start_date, args.end_date, store, args.force)
@@ -0,0 +1,159 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gzip
+import json
+from datetime import date, timedelta
+from config.config import (
+    TMDB_EXPORTS_URL, CRAWL_PREFIX, CRAWL_SHARD_SIZE, CRAWL_SHARDS_PER_RUN,
+    CRAWL_MIN_POPULARITY, TMDB_CONNECT_TIMEOUT, TMDB_READ_TIMEOUT
+)
+from raw_store import open_raw_store
+from extract import MovieDataExtractor
+from transform import transform_data
+from load import DatabaseLoader
+
+# Export date of the crawl in progress; cleared once all of its shards are done
+CURRENT_CRAWL_KEY = f"{CRAWL_PREFIX}/current.json"
+
+class CatalogCrawler:
+    '''Crawl every movie in a TMDB daily ID export, a few shards per run'''
+    def __init__(self, export_date, store=None, extractor=None):
+        self.export_date = export_date
+        self.store = store or open_raw_store()
+        self.extractor = extractor or MovieDataExtractor()
+        self.prefix = f"{CRAWL_PREFIX}/{export_date.isoformat()}"
+
+    def manifest_key(self):
+        return f"{self.prefix}/manifest.json"
+
+    def shard_key(self, shard):
+        return f"{self.prefix}/shards/{shard:05d}.json"
+
+    def done_key(self, shard):
+        return f"{self.prefix}/done/{shard:05d}.json"
+
+    def open_export(self, export_path=None):
+        '''Open the gzipped export as a byte stream (local stand-in or TMDB download)'''
+        if export_path:
+            return open(export_path, 'rb')
+
+        url = f"{TMDB_EXPORTS_URL}/movie_ids_{self.export_date:%m_%d_%Y}.json.gz"
+        response = self.extractor.session.get(
+            url, stream=True, timeout=(TMDB_CONNECT_TIMEOUT, TMDB_READ_TIMEOUT)
+        )
+        response.raise_for_status()
+        return response.raw
+
+    def plan(self, export_path=None):
+        '''Stream the export into fixed-size shards of movie IDs, unless already planned'''
+        if self.store.exists(self.manifest_key()):
+            return json.loads(self.store.read(self.manifest_key()))
+
+        shard, total_ids, pending = 0, 0, []
+
+        def flush():
+            nonlocal shard, pending
+            self.store.write(self.shard_key(shard), json.dumps(pending).encode('utf-8'))
+            shard += 1
+            pending = []
+
+        # One JSON object per line; only a shard's worth of IDs is held in memory
+        with self.open_export(export_path) as raw, gzip.GzipFile(fileobj=raw) as lines:
+            for line in lines:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get('adult') or entry.get('video'):
+                    continue
+                if entry.get('popularity', 0) < CRAWL_MIN_POPULARITY:
+                    continue
+                pending.append(entry['id'])
+                total_ids += 1
+                if len(pending) >= CRAWL_SHARD_SIZE:
+                    flush()
+        if pending:
+            flush()
+
+        # Written last, so an interrupted plan is simply redone
+        manifest = {'export_date' : self.export_date.isoformat(), 'shards' : shard, 'movies' : total_ids}
+        self.store.write(self.manifest_key(), json.dumps(manifest).encode('utf-8'))
+        print(f"Planned crawl of {total_ids} movies in {shard} shards")
+        return manifest
+
+    def pending_shards(self, manifest):
+        done = {int(key.rsplit('/', 1)[1].split('.')[0])
+                for key in self.store.list_keys(f"{self.prefix}/done/")}
+        return [shard for shard in range(manifest['shards']) if shard not in done]
+
+    def crawl_shard(self, shard, loader, archive=True):
+        '''Fetch, archive, transform and load one shard, then mark it done'''
+        movie_ids = json.loads(self.store.read(self.shard_key(shard)))
+        details = [d for d in self.extractor.get_movies_details(movie_ids) if d]
+
+        if archive:
+            self.extractor.save_raw_data_to_s3(details, f"crawl_{self.export_date:%Y%m%d}_shard{shard:05d}")
+
+        # Catalog movies are loaded for their content only: their stats would join today's
+        # snapshot, its averages and its ranking in whatever order the shards are crawled
+        transformed = transform_data(details)
+        transformed['daily_stats'] = []
+        summary = loader.load_all(transformed)
+
+        result = {'shard' : shard, 'requested' : len(movie_ids), 'fetched' : len(details)}
+        result.update(summary)
+        self.store.write(self.done_key(shard), json.dumps(result).encode('utf-8'))
+        print(f"Crawled shard {shard}: {result}")
+        return result
+
+def current_crawl(store):
+    '''Export date of the unfinished crawl, if there is one'''
+    if not store.exists(CURRENT_CRAWL_KEY):
+        return None
+    return date.fromisoformat(json.loads(store.read(CURRENT_CRAWL_KEY))['export_date'])
+
+def crawl_data(export_date=None, max_shards=CRAWL_SHARDS_PER_RUN, store=None,
+               export_path=None, archive=True):
+    '''Crawl the next pending shards of the catalog; re-running resumes the crawl
+
+    Without an export date the unfinished crawl is continued, and a new export
+    is only planned once every shard of the current one is done.
+    '''
+    store = store or open_raw_store()
+    # Today's export is published during the morning, yesterday's is always there
+    export_date = export_date or current_crawl(store) or date.today() - timedelta(days=1)
+    crawler = CatalogCrawler(export_date, store)
+    manifest = crawler.plan(export_path)
+    pending = crawler.pending_shards(manifest)
+
+    loader = DatabaseLoader()
+    results = []
+    try:
+        for shard in pending[:max_shards]:
+            results.append(crawler.crawl_shard(shard, loader, archive))
+        loader.refresh_derived()
+    finally:
+        loader.close()
+
+    remaining = len(pending) - len(results)
+    if remaining:
+        store.write(CURRENT_CRAWL_KEY, json.dumps({'export_date' : export_date.isoformat()}).encode('utf-8'))
+    elif current_crawl(store) == export_date:
+        store.delete(CURRENT_CRAWL_KEY)
+    print(f"Crawl {export_date}: {len(results)} shards this run, {remaining} remaining")
+    return {'export_date' : export_date.isoformat(), 'shards' : results, 'remaining_shards' : remaining}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Crawl the full TMDB catalog from a daily ID export')
+    parser.add_argument('--export-date', type=date.fromisoformat,
+                        help='export to crawl (default: the unfinished crawl, else yesterday)')
+    parser.add_argument('--export-file', help='local movie_ids_*.json.gz instead of downloading')
+    parser.add_argument('--local-dir', help='directory standing in for the S3 bucket')
+    parser.add_argument('--shards', type=int, default=CRAWL_SHARDS_PER_RUN, help='shards to crawl this run')
+    parser.add_argument('--no-archive', action='store_true', help="don't archive raw details to S3")
+    args = parser.parse_args()
+
+    store = open_raw_store(args.local_dir) if args.local_dir else None
+    crawl_data(args.export_date, args.shards, store, args.export_file, not args.no_archive)
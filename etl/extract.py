@@ -1,83 +1,640 @@
 import requests
 import json 
 import boto3
-from datetime import datetime
-from config.config import TMDB_API_KEY, TMDB_BASE_URL, S3_BUCKET
+import hashlib
+import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from config.config import (
+    TMDB_API_KEY, TMDB_BASE_URL, S3_BUCKET, TMDB_MAX_WORKERS,
+    TMDB_REQUESTS_PER_SECOND, TMDB_BURST, TMDB_POPULAR_PAGES, TMDB_APPEND_TO_RESPONSE, TMDB_COMPACT_RECORDS,
+    TMDB_POOL_SIZE, TMDB_CONNECT_TIMEOUT, TMDB_READ_TIMEOUT,
+    TMDB_MAX_RETRIES, TMDB_BACKOFF_BASE, TMDB_BACKOFF_MAX,
+    TMDB_CACHE_DIR, TMDB_CACHE_MAX_BYTES, TMDB_CACHE_TTLS,
+    INCREMENTAL_EXTRACT, EXTRACT_STATE_KEY, TMDB_CHANGES_MAX_DAYS, STREAM_BATCH_SIZE,
+    RAW_ARCHIVE_PREFIX, RAW_ARCHIVE_COMPRESSION, RAW_ARCHIVE_PART_SIZE
+)
+from models import PopularPage, MovieDetails, msgspec, loads, decode, mark_stats_only, json_default
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    '''Thread-safe token bucket shared by all TMDB requests'''
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''Block until a request may be sent'''
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        '''Stop handing out tokens for a while (e.g. after a 429)'''
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+            self.updated = self.paused_until
+
+
+class ResponseCache:
+    '''Size-bounded LRU cache of TMDB responses stored as files in a directory'''
+    def __init__(self, directory, max_bytes=TMDB_CACHE_MAX_BYTES, ttls=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = ttls if ttls is not None else TMDB_CACHE_TTLS
+        self.lock = threading.Lock()
+        self.stats = {'hits' : 0, 'misses' : 0, 'revalidated' : 0, 'evictions' : 0, 'bytes_saved' : 0}
+        os.makedirs(directory, exist_ok=True)
+
+        # File sizes and last-access times survive warm invocations on disk
+        self.entries = {}
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                stat = os.stat(os.path.join(directory, name))
+                self.entries[name] = (stat.st_size, stat.st_mtime)
+
+    def make_key(self, path, params):
+        '''Cache key for an endpoint and its query params (API key excluded)'''
+        query = sorted((k, str(v)) for k, v in params.items() if k != 'api_key')
+        return f"{path}?{query}"
+
+    def ttl(self, endpoint):
+        '''Freshness lifetime in seconds for an endpoint template'''
+        return self.ttls.get(endpoint, 0)
+
+    def filename(self, key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json'
+
+    def get(self, key):
+        '''Return the stored entry for a key, or None'''
+        name = self.filename(key)
+        try:
+            with open(os.path.join(self.directory, name)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.touch(name)
+        return entry
+
+    def touch(self, name):
+        '''Mark a file as recently used'''
+        now = time.time()
+        try:
+            os.utime(os.path.join(self.directory, name), (now, now))
+        except OSError:
+            return
+        with self.lock:
+            if name in self.entries:
+                self.entries[name] = (self.entries[name][0], now)
+
+    def put(self, key, body, etag=None, last_modified=None):
+        '''Store a response body and its validators, evicting old entries if needed'''
+        name = self.filename(key)
+        entry = {
+            'key' : key,
+            'stored_at' : time.time(),
+            'etag' : etag,
+            'last_modified' : last_modified,
+            'body' : body
+        }
+        data = json.dumps(entry)
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.entries[name] = (len(data), time.time())
+            self.evict()
+
+    def evict(self):
+        '''Drop least recently used files until the cache fits in max_bytes (lock held)'''
+        total = sum(size for size, _ in self.entries.values())
+        if total <= self.max_bytes:
+            return
+        for name, (size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            del self.entries[name]
+            self.stats['evictions'] += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def record(self, counter, body_bytes=0):
+        with self.lock:
+            self.stats[counter] += 1
+            self.stats['bytes_saved'] += body_bytes
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['entries'] = len(self.entries)
+        return stats
+
+
+class RawArchiveWriter:
+    '''Stream records to S3 as compressed NDJSON using a multipart upload'''
+    EXTENSIONS = {'gzip' : '.ndjson.gz', 'zstd' : '.ndjson.zst'}
+
+    def __init__(self, s3_client, name, run_time=None, compression=RAW_ARCHIVE_COMPRESSION,
+                 bucket=S3_BUCKET, prefix=RAW_ARCHIVE_PREFIX, part_size=RAW_ARCHIVE_PART_SIZE):
+        if compression == 'zstd' and zstandard is None:
+            print("zstandard is not installed, falling back to gzip")
+            compression = 'gzip'
+
+        run_time = run_time or datetime.now()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = (f"{prefix}/dt={run_time:%Y-%m-%d}/hour={run_time:%H}/"
+                    f"{name}{self.EXTENSIONS[compression]}")
+        self.part_size = max(part_size, 5 * 1024 * 1024)  # S3 minimum part size
+        self.compressor = (zstandard.ZstdCompressor().compressobj() if compression == 'zstd'
+                           else zlib.compressobj(wbits=31))
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.parts = []
+        self.stats = {'records' : 0, 'raw_bytes' : 0, 'compressed_bytes' : 0, 'parts' : 0}
+
+    def write(self, record):
+        '''Append one record as a JSON line'''
+        line = (json.dumps(record, separators=(',', ':'), default=json_default) + '\n').encode('utf-8')
+        self.stats['records'] += 1
+        self.stats['raw_bytes'] += len(line)
+        self.buffer += self.compressor.compress(line)
+        if len(self.buffer) >= self.part_size:
+            self.upload_part()
+
+    def upload_part(self):
+        if self.upload_id is None:
+            self.upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType='application/x-ndjson'
+            )['UploadId']
+
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=part_number, Body=bytes(self.buffer)
+        )
+        self.parts.append({'ETag' : response['ETag'], 'PartNumber' : part_number})
+        self.stats['compressed_bytes'] += len(self.buffer)
+        self.stats['parts'] += 1
+        self.buffer = bytearray()
+
+    def close(self):
+        '''Flush the compressor and finish the upload, returning the byte/record counts'''
+        self.buffer += self.compressor.flush()
+
+        if self.upload_id is None:
+            # Small archives fit in a single request
+            self.s3_client.put_object(
+                Bucket=self.bucket, Key=self.key, Body=bytes(self.buffer),
+                ContentType='application/x-ndjson'
+            )
+            self.stats['compressed_bytes'] += len(self.buffer)
+            self.stats['parts'] += 1
+        else:
+            self.upload_part()
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                MultipartUpload={'Parts' : self.parts}
+            )
+
+        print(f"Archived {self.stats['records']} records to s3://{self.bucket}/{self.key}: "
+              f"{self.stats['raw_bytes']} bytes raw, {self.stats['compressed_bytes']} compressed")
+        return self.stats
+
+    def abort(self):
+        '''Discard a partially uploaded archive'''
+        if self.upload_id is not None:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+            )
+            self.upload_id = None
+
 
 class MovieDataExtractor:
-    def __init__(self):
+    def __init__(self, max_workers=TMDB_MAX_WORKERS, requests_per_second=TMDB_REQUESTS_PER_SECOND,
+                 cache_dir=TMDB_CACHE_DIR, compact_records=TMDB_COMPACT_RECORDS):
         self.api_key = TMDB_API_KEY
         self.base_url = TMDB_BASE_URL
         self.s3_client = boto3.client('s3')
+        self.max_workers = max_workers
+        self.rate_limiter = TokenBucket(requests_per_second, TMDB_BURST)
+        self.session = self.create_session(TMDB_POOL_SIZE)
+        self.timeout = (TMDB_CONNECT_TIMEOUT, TMDB_READ_TIMEOUT)
+        self.max_retries = TMDB_MAX_RETRIES
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'requests' : 0,
+            'retries' : 0,
+            'failures' : 0,
+            'request_seconds' : 0.0,
+            'backoff_seconds' : 0.0
+        }
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        if compact_records and msgspec is None:
+            print("msgspec is not installed, keeping TMDB responses as dicts")
+            compact_records = False
+        self.compact_records = compact_records
+
+    def create_session(self, pool_size):
+        '''Create a keep-alive session shared by all worker threads'''
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def record(self, **counters):
+        '''Add to the per-extractor request counters'''
+        with self.stats_lock:
+            for key, value in counters.items():
+                self.stats[key] += value
+
+    def get_stats(self):
+        '''Return request counters with the average latency per call'''
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats['avg_request_ms'] = (
+            round(stats['request_seconds'] / stats['requests'] * 1000, 1)
+            if stats['requests'] else 0.0
+        )
+        if self.cache:
+            stats['cache'] = self.cache.get_stats()
+        return stats
+
+    def backoff_delay(self, attempt, response=None):
+        '''Seconds to wait before retry number `attempt` (Retry-After wins)'''
+        if response is not None and response.headers.get('Retry-After'):
+            try:
+                return float(response.headers['Retry-After'])
+            except ValueError:
+                pass
+        delay = min(TMDB_BACKOFF_MAX, TMDB_BACKOFF_BASE * (2 ** attempt))
+        return random.uniform(0, delay)
+
+    def request(self, path, params=None, endpoint=None, record_type=None):
+        '''GET a TMDB endpoint as JSON, going through the response cache when enabled
+
+        With a `record_type` the body is decoded into that record instead of a dict.
+        '''
+        params = dict(params or {}, api_key=self.api_key)
+        if not self.compact_records:
+            record_type = None
+
+        ttl = self.cache.ttl(endpoint) if self.cache and endpoint else 0
+        if not ttl:
+            response = self.fetch(path, params)
+            if response is None:
+                return None
+            return self.decode_body(response.content, record_type)
+
+        key = self.cache.make_key(path, params)
+        entry = self.cache.get(key)
+        if entry and time.time() - entry['stored_at'] < ttl:
+            self.cache.record('hits', len(json.dumps(entry['body'])))
+            return self.to_record(entry['body'], record_type)
+
+        # Stale entries are revalidated with their ETag / Last-Modified
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        response = self.fetch(path, params, headers)
+        if response is None:
+            return None
+        if response.status_code == 304 and entry:
+            self.cache.record('revalidated', len(json.dumps(entry['body'])))
+            self.cache.put(key, entry['body'], entry.get('etag'), entry.get('last_modified'))
+            return self.to_record(entry['body'], record_type)
+
+        body = loads(response.content)
+        self.cache.record('misses')
+        self.cache.put(key, body, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return self.to_record(body, record_type)
+
+    def decode_body(self, content, record_type=None):
+        '''Decode a response body, straight into a record when one is given'''
+        if record_type:
+            try:
+                return decode(content, record_type)
+            except msgspec.ValidationError as e:
+                print(f"Unexpected {record_type.__name__} payload, keeping it as a dict: {e}")
+        return loads(content)
+
+    def to_record(self, body, record_type=None):
+        '''Convert an already decoded (cached) body into a record when one is given'''
+        if record_type:
+            try:
+                return msgspec.convert(body, record_type)
+            except msgspec.ValidationError as e:
+                print(f"Unexpected {record_type.__name__} payload, keeping it as a dict: {e}")
+        return body
+
+    def fetch(self, path, params, headers=None):
+        '''GET with rate limiting and retries, returning the 200/304 response or None'''
+        url = f"{self.base_url}{path}"
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+                error = None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response = None
+                error = e
+            self.record(requests=1, request_seconds=time.perf_counter() - started)
+
+            if response is not None:
+                if response.status_code in (200, 304):
+                    return response
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    print(f"Error fetching {path}: {response.status_code}")
+                    break
+                error = response.status_code
+
+            if attempt == self.max_retries:
+                print(f"Giving up on {path} after {attempt + 1} attempts: {error}")
+                break
+
+            delay = self.backoff_delay(attempt, response)
+            print(f"Retrying {path} in {delay:.2f}s ({error})")
+            self.record(retries=1, backoff_seconds=delay)
+            if response is not None and response.status_code == 429:
+                # Throttle every worker, not just this one
+                self.rate_limiter.pause(delay)
+            else:
+                time.sleep(delay)
+
+        self.record(failures=1)
+        return None
 
     def get_popular_movies(self, pages=1):
         '''Fetch popular movies from TMDB API'''
         all_movies = []
 
-        for page in range(1, pages + 1):
-            url = f"{self.base_url}/movie/popular"
+        for _, page_movies in self.iter_popular_movies(pages):
+            all_movies.extend(page_movies)
+
+        return all_movies
+
+    def iter_popular_movies(self, pages=1, start_page=1):
+        '''Yield (page number, popular movies) one page at a time'''
+        for page in range(start_page, pages + 1):
             params = {
-                'api_key' : self.api_key,
                 'page' : page,
                 'language' : 'en-US'
             }
 
-            response = requests.get(url, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                all_movies.extend(data['results'])
+            data = self.request("/movie/popular", params, record_type=PopularPage)
+            if data is not None:
+                yield page, data['results']
             else:
-                print(f"Error fetching page {page}: {response.status_code}")
-
-        return all_movies
+                print(f"Error fetching page {page}")
 
     def get_movie_details(self, movie_id):
         '''Get detailed movie information'''
-        url = f"{self.base_url}/movie/{movie_id}"
         params = {
-            'api_key' : self.api_key,
             'language' : 'en-US'
         }
 
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            return response.json()
-        return None
+        # Credits, release dates etc. ride along in the same round trip
+        if TMDB_APPEND_TO_RESPONSE:
+            params['append_to_response'] = TMDB_APPEND_TO_RESPONSE
+
+        return self.request(f"/movie/{movie_id}", params, endpoint='/movie/{id}', record_type=MovieDetails)
+
+    def get_movies_details(self, movie_ids):
+        '''Fetch details for many movies concurrently, keeping input order'''
+        if not movie_ids:
+            return []
+
+        workers = min(self.max_workers, len(movie_ids))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.get_movie_details, movie_ids))
+
+    def get_changed_movie_ids(self, start_date, end_date):
+        '''Fetch the IDs of every movie TMDB reports as changed between two dates'''
+        changed_ids = set()
+        page, total_pages = 1, 1
+
+        while page <= total_pages:
+            params = {
+                'start_date' : start_date.isoformat(),
+                'end_date' : end_date.isoformat(),
+                'page' : page
+            }
+            data = self.request("/movie/changes", params)
+            if data is None:
+                # Without the full change list we can't trust an incremental run
+                return None
+            changed_ids.update(result['id'] for result in data['results'])
+            total_pages = data.get('total_pages', 1)
+            page += 1
+
+        return changed_ids
+
+    def load_extract_state(self):
+        '''Read the last-run watermark and popular IDs from S3'''
+        try:
+            response = self.s3_client.get_object(Bucket=S3_BUCKET, Key=EXTRACT_STATE_KEY)
+            return json.loads(response['Body'].read())
+        except Exception as e:
+            print(f"No extract state found, running a full extract: {e}")
+            return None
+
+    def save_extract_state(self, state):
+        '''Persist the watermark and popular IDs for the next incremental run'''
+        self.s3_client.put_object(
+            Bucket=S3_BUCKET,
+            Key=EXTRACT_STATE_KEY,
+            Body=json.dumps(state),
+            ContentType='application/json'
+        )
+        print(f"Saved extract watermark {state['watermark']}")
+
+    def select_movies_to_refresh(self, popular_movies, state, run_started):
+        '''Return the popular movie IDs whose details need fetching this run'''
+        popular_ids = [movie['id'] for movie in popular_movies]
+        if not state:
+            return popular_ids
+
+        watermark = datetime.fromisoformat(state['watermark'])
+        if run_started - watermark > timedelta(days=TMDB_CHANGES_MAX_DAYS):
+            print("Watermark is older than the TMDB change window, running a full extract")
+            return popular_ids
+
+        changed_ids = self.get_changed_movie_ids(watermark.date(), run_started.date())
+        if changed_ids is None:
+            return popular_ids
+
+        known_ids = set(state.get('popular_ids', []))
+        return [movie_id for movie_id in popular_ids
+                if movie_id in changed_ids or movie_id not in known_ids]
     
-    def save_raw_data_to_s3(self, data, filename):
-        '''Save raw JSON data to S3'''
+    def open_raw_archive(self, name, run_time=None):
+        '''Start a streaming raw archive for this run'''
+        return RawArchiveWriter(self.s3_client, name, run_time)
+
+    def save_raw_data_to_s3(self, data, name, run_time=None):
+        '''Save raw movie records to S3 as compressed NDJSON'''
+        archive = self.open_raw_archive(name, run_time)
         try:
-            self.s3_client.put_object(
-                Bucket=S3_BUCKET,
-                Key=f"raw-data/{filename}",
-                Body=json.dumps(data, indent=2),
-                ContentType='application/json'
-            )
-            print(f"Saved {filename} to S3")
-            return True
+            for record in data:
+                archive.write(record)
+            return archive.close()
         except Exception as e:
             print(f"Error saving to S3: {e}")
-            return False
-        
-def extract_data():
+            archive.abort()
+            return None
+
+pending_extract_state = None
+
+def extract_data(incremental=INCREMENTAL_EXTRACT):
     '''Main Extraction Function'''
+    global pending_extract_state
     extractor = MovieDataExtractor()
+    run_started = datetime.now()
+
+    # Get popular movies (pages can overlap; a repeated movie would break the batch upsert)
+    popular_movies = extractor.get_popular_movies(pages=TMDB_POPULAR_PAGES)
+    popular_movies = list({movie['id']: movie for movie in popular_movies}.values())
 
-    # Get popular movies
-    popular_movies = extractor.get_popular_movies(pages=3)
+    # Get detailed info for every popular movie (or only changed/new ones)
+    if incremental:
+        movie_ids = extractor.select_movies_to_refresh(
+            popular_movies, extractor.load_extract_state(), run_started
+        )
+        print(f"Incremental extract: refreshing {len(movie_ids)} of {len(popular_movies)} movies")
+    else:
+        movie_ids = [movie['id'] for movie in popular_movies]
+    detailed_movies = [d for d in extractor.get_movies_details(movie_ids) if d]
 
-    # Get detailed info for top movies
-    detailed_movies = []
-    for movie in popular_movies[:5]:
-        details = extractor.get_movie_details(movie['id'])
-        if details:
-            detailed_movies.append(details)
+    if incremental:
+        # Unchanged movies still get today's stats from the popular list entry
+        fetched_ids = {movie['id'] for movie in detailed_movies}
+        for movie in popular_movies:
+            if movie['id'] not in fetched_ids:
+                detailed_movies.append(mark_stats_only(movie))
+
+        # Movies whose fetch failed stay unknown so the next run retries them
+        refreshed_ids = set(movie_ids)
+        known_ids = fetched_ids | {m['id'] for m in popular_movies if m['id'] not in refreshed_ids}
+        pending_extract_state = {
+            'watermark' : run_started.isoformat(),
+            'popular_ids' : sorted(known_ids)
+        }
 
     # Save t0 S3
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    timestamp = run_started.strftime('%Y%m%d_%H%M%S')
     extractor.save_raw_data_to_s3(
         detailed_movies,
-        f"movies_detailed_{timestamp}.json"
+        f"movies_detailed_{timestamp}",
+        run_started
     )
 
-    return detailed_movies
\ No newline at end of file
+    print(f"TMDB request stats: {extractor.get_stats()}")
+    return detailed_movies
+
+def stream_extract_data(batch_size=STREAM_BATCH_SIZE, cursor=None, should_stop=None):
+    '''Yield batches of detailed movies while popular pages are still being read
+
+    `cursor` records the pages read and the ordered movie IDs so an interrupted
+    run can resume at `next_index`; `should_stop` is polled before each new page
+    or batch so the caller can wind down before a deadline.
+    '''
+    cursor = cursor if cursor is not None else {}
+    cursor.setdefault('pages_done', 0)
+    cursor.setdefault('movie_ids', [])
+    cursor.setdefault('next_index', 0)
+    should_stop = should_stop or (lambda: False)
+
+    extractor = MovieDataExtractor()
+    run_started = datetime.now()
+    archive = extractor.open_raw_archive(f"movies_detailed_{run_started:%Y%m%d_%H%M%S}", run_started)
+    seen_ids = set(cursor['movie_ids'])
+    pending_ids = cursor['movie_ids'][cursor['next_index']:]
+
+    def fetch_batch(movie_ids):
+        batch = [d for d in extractor.get_movies_details(movie_ids) if d]
+        for movie in batch:
+            archive.write(movie)
+        return batch
+
+    try:
+        pages = extractor.iter_popular_movies(TMDB_POPULAR_PAGES, cursor['pages_done'] + 1)
+        pages_exhausted = False
+        while not should_stop():
+            next_page = next(pages, None)
+            if next_page is None:
+                pages_exhausted = True
+                break
+            page, page_movies = next_page
+
+            # Popular pages can overlap; a repeated movie would break the batch upsert
+            for movie in page_movies:
+                if movie['id'] not in seen_ids:
+                    seen_ids.add(movie['id'])
+                    pending_ids.append(movie['id'])
+                    cursor['movie_ids'].append(movie['id'])
+            cursor['pages_done'] = page
+
+            while len(pending_ids) >= batch_size and not should_stop():
+                yield fetch_batch(pending_ids[:batch_size])
+                pending_ids = pending_ids[batch_size:]
+
+        while pending_ids and not should_stop():
+            yield fetch_batch(pending_ids[:batch_size])
+            pending_ids = pending_ids[batch_size:]
+        cursor['extract_complete'] = pages_exhausted and not pending_ids
+    except GeneratorExit:
+        # The consumer stopped early; what was fetched is still worth archiving
+        archive.close()
+        raise
+    except BaseException:
+        archive.abort()
+        raise
+
+    archive.close()
+    print(f"TMDB request stats: {extractor.get_stats()}")
+
+def commit_extract_state():
+    '''Save the incremental watermark once the extracted data has been loaded'''
+    global pending_extract_state
+    if pending_extract_state is None:
+        return
+    MovieDataExtractor().save_extract_state(pending_extract_state)
+    pending_extract_state = None
\ No newline at end of file
@@ -0,0 +1,163 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+import boto3
+from config.config import (
+    FANOUT_BACKEND, FANOUT_FUNCTION_NAME, FANOUT_MAX_CONCURRENCY,
+    FANOUT_PAGES_PER_SHARD, FANOUT_IDS_PER_SHARD, TMDB_POPULAR_PAGES
+)
+from extract import MovieDataExtractor
+from transform import transform_data
+from load import load_data
+
+# tmdb id column of every per-movie table, used to keep one shard's rows per movie
+MOVIE_KEYED_TABLES = {
+    'movies' : 'tmdb_id',
+    'fingerprints' : 'tmdb_id',
+    'daily_stats' : 'tmdb_movie_id',
+    'movie_genres' : 'tmdb_movie_id',
+    'credits' : 'tmdb_movie_id',
+    'release_dates' : 'tmdb_movie_id',
+    'keywords' : 'tmdb_movie_id',
+    'external_ids' : 'tmdb_movie_id',
+    'sub_resources' : 'tmdb_movie_id'
+}
+
+def plan_shards(pages=None, movie_ids=None):
+    '''Split the workload into page-range shards, or ID-range shards when IDs are given'''
+    if movie_ids:
+        return [{'ids' : movie_ids[i:i + FANOUT_IDS_PER_SHARD]}
+                for i in range(0, len(movie_ids), FANOUT_IDS_PER_SHARD)]
+
+    pages = pages or TMDB_POPULAR_PAGES
+    return [{'pages' : [start, min(start + FANOUT_PAGES_PER_SHARD - 1, pages)]}
+            for start in range(1, pages + 1, FANOUT_PAGES_PER_SHARD)]
+
+def run_worker(shard):
+    '''Extract and transform one shard; the result is JSON-safe for a Lambda response'''
+    extractor = MovieDataExtractor()
+
+    if 'ids' in shard:
+        movie_ids = shard['ids']
+        name = f"movies_detailed_{datetime.now():%Y%m%d_%H%M%S}_ids{movie_ids[0]}"
+    else:
+        start, end = shard['pages']
+        popular = {}
+        for _, page_movies in extractor.iter_popular_movies(end, start):
+            for movie in page_movies:
+                popular.setdefault(movie['id'], movie)
+        movie_ids = list(popular)
+        name = f"movies_detailed_{datetime.now():%Y%m%d_%H%M%S}_pages{start}-{end}"
+
+    details = [d for d in extractor.get_movies_details(movie_ids) if d]
+    extractor.save_raw_data_to_s3(details, name)
+
+    # Dates become ISO strings, which PostgreSQL casts back on insert
+    return json.loads(json.dumps(transform_data(details), default=str))
+
+def merge_transformed(results):
+    '''Combine per-shard outputs, keeping each movie's rows from the first shard that has it'''
+    merged = {}
+    owners = {}
+    genres = {}
+
+    for index, result in enumerate(results):
+        for movie in result.get('movies', []):
+            owners.setdefault(movie['tmdb_id'], index)
+        for stat in result.get('daily_stats', []):
+            owners.setdefault(stat['tmdb_movie_id'], index)
+        for genre in result.get('genres', []):
+            genres[genre['tmdb_genre_id']] = genre
+
+        for table, id_column in MOVIE_KEYED_TABLES.items():
+            merged.setdefault(table, []).extend(
+                row for row in result.get(table, []) if owners.get(row[id_column]) == index
+            )
+
+    merged['genres'] = list(genres.values())
+    return merged
+
+class LambdaBackend:
+    '''Run shards as synchronous invocations of the worker Lambda'''
+    def __init__(self, function_name=FANOUT_FUNCTION_NAME, max_concurrency=FANOUT_MAX_CONCURRENCY):
+        self.function_name = function_name
+        self.max_concurrency = max_concurrency
+        self.lambda_client = boto3.client('lambda')
+
+    def invoke(self, shard):
+        response = self.lambda_client.invoke(
+            FunctionName=self.function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps({'mode' : 'worker', 'shard' : shard}).encode('utf-8')
+        )
+        payload = json.loads(response['Payload'].read())
+        if response.get('FunctionError') or payload.get('statusCode') != 200:
+            raise RuntimeError(f"Worker failed for shard {shard}: {payload}")
+        return json.loads(payload['body'])['transformed']
+
+    def map(self, shards):
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = [executor.submit(self.invoke, shard) for shard in shards]
+            return [future.exception() or future.result() for future in futures]
+
+class ProcessPoolBackend:
+    '''Local stand-in for Lambda workers, for tests and single-machine benchmarks'''
+    def __init__(self, max_concurrency=FANOUT_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+
+    def map(self, shards):
+        with ProcessPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = [executor.submit(run_worker, shard) for shard in shards]
+            return [future.exception() or future.result() for future in futures]
+
+def get_backend(name=FANOUT_BACKEND):
+    return ProcessPoolBackend() if name == 'local' else LambdaBackend()
+
+def coordinate(pages=None, movie_ids=None, backend=None):
+    '''Fan shards out to workers, then load the merged result in dependency order'''
+    backend = backend or get_backend()
+    shards = plan_shards(pages, movie_ids)
+    print(f"Dispatching {len(shards)} shards to {type(backend).__name__}")
+
+    started = time.perf_counter()
+    outcomes = backend.map(shards)
+    extract_seconds = time.perf_counter() - started
+
+    results, failed = [], []
+    for shard, outcome in zip(shards, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"Shard {shard} failed: {outcome}")
+            failed.append(shard)
+        else:
+            results.append(outcome)
+
+    # Genres -> movies -> relationships/stats/sub-resources, as load_all orders them
+    merged = merge_transformed(results)
+    started = time.perf_counter()
+    summary = load_data(merged)
+    load_seconds = time.perf_counter() - started
+
+    report = {
+        'shards' : len(shards),
+        'failed_shards' : failed,
+        'movies_processed' : len(merged['movies']),
+        'extract_seconds' : round(extract_seconds, 2),
+        'load_seconds' : round(load_seconds, 2)
+    }
+    report.update(summary)
+    print(f"Fan-out finished: {report}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the ETL as coordinator + local worker processes')
+    parser.add_argument('--pages', type=int, default=TMDB_POPULAR_PAGES, help='popular pages to shard')
+    parser.add_argument('--workers', type=int, default=FANOUT_MAX_CONCURRENCY, help='worker processes')
+    args = parser.parse_args()
+
+    coordinate(pages=args.pages, backend=ProcessPoolBackend(args.workers))
@@ -1,13 +1,67 @@
 import json
-from extract import extract_data
-from transform import transform_data
-from load import load_data
+from datetime import date, datetime, timedelta
+from extract import extract_data, stream_extract_data, commit_extract_state
+from transform import transform_data, transform_batches
+from load import load_data, load_batches, key_cache_stats, connection_stats
+from raw_store import open_raw_store
+from config.config import (
+    STREAM_PIPELINE, STREAM_BATCH_SIZE, DEADLINE_SAFETY_MS,
+    PIPELINE_CURSOR_KEY, PIPELINE_CURSOR_MAX_AGE_HOURS
+)
+
+class Deadline:
+    '''Tells the pipeline when to stop taking new work before the Lambda timeout'''
+    def __init__(self, context, safety_ms=DEADLINE_SAFETY_MS):
+        self.context = context
+        self.safety_ms = safety_ms
+
+    def expired(self):
+        if self.context is None:
+            return False
+        return self.context.get_remaining_time_in_millis() < self.safety_ms
+
+def load_cursor(store):
+    '''Read the unfinished run's cursor, ignoring cursors that are too old to resume'''
+    if not store.exists(PIPELINE_CURSOR_KEY):
+        return None
+    cursor = json.loads(store.read(PIPELINE_CURSOR_KEY))
+    age = datetime.now() - datetime.fromisoformat(cursor['started_at'])
+    if age > timedelta(hours=PIPELINE_CURSOR_MAX_AGE_HOURS):
+        print(f"Discarding cursor from {cursor['started_at']}")
+        return None
+    return cursor
+
+def save_cursor(store, cursor):
+    # The extract thread may still be appending IDs, so save a copy
+    snapshot = dict(cursor, movie_ids=list(cursor['movie_ids']))
+    store.write(PIPELINE_CURSOR_KEY, json.dumps(snapshot).encode('utf-8'))
 
 def lambda_handler(event, context):
     '''AWS Lambda handler for ETL pipeline'''
     try:
         print("Starting ETL pipeline...")
 
+        event = event or {}
+        mode = event.get('mode', 'stream' if STREAM_PIPELINE else 'batch')
+        if mode in ('stream', 'batch'):
+            store = open_raw_store()
+            cursor = load_cursor(store)
+            if mode == 'stream' or cursor:
+                # An unfinished run always resumes through the streaming path
+                return run_streaming_pipeline(context, store, cursor)
+        if mode == 'compact':
+            return run_compaction(event)
+        if mode == 'migrate':
+            return run_migrations(event)
+        if mode == 'retention':
+            return run_retention(event)
+        if mode == 'crawl':
+            return run_crawl(event)
+        if mode == 'coordinator':
+            return run_coordinator(event)
+        if mode == 'worker':
+            return run_fanout_worker(event)
+
         # Extract
         print("Extracting data...")
         raw_data = extract_data()
@@ -20,14 +74,22 @@ def lambda_handler(event, context):
 
         # Load
         print("Loading data...")
-        load_data(transformed_data)
+        load_summary = load_data(transformed_data)
         print("✅ Data successfully loaded into database")
 
+        # Only advance the incremental watermark once the load has succeeded
+        commit_extract_state()
+
         return {
             'statusCode' : 200,
             'body' : json.dumps({
                 'message' : 'ETL pipeline completed successfully',
-                'movies_processed' : len(transformed_data['movies'])
+                'movies_processed' : len(transformed_data['movies']),
+                'movies_changed' : load_summary['movies_changed'],
+                'movies_unchanged' : load_summary['movies_unchanged'],
+                'rows' : load_summary['rows'],
+                'key_cache' : key_cache_stats(reset=True),
+                'db_connection' : connection_stats(reset=True)
             })
         }
     
@@ -38,4 +100,144 @@ def lambda_handler(event, context):
             'body' : json.dumps({
                 'error' : str(e)
             })
-        }
\ No newline at end of file
+        }
+
+def run_streaming_pipeline(context=None, store=None, cursor=None):
+    '''Extract, transform and load batch by batch, checkpointing before the deadline'''
+    store = store or open_raw_store()
+    deadline = Deadline(context)
+    if cursor:
+        print(f"Resuming run from {cursor['started_at']} at movie {cursor['next_index']}")
+    else:
+        cursor = {'started_at' : datetime.now().isoformat(), 'pages_done' : 0, 'movie_ids' : [],
+                  'next_index' : 0, 'movies_fetched' : 0, 'batches_loaded' : 0}
+    start_index = cursor['next_index']
+
+    def on_batch_loaded(batch, totals):
+        # Every batch but the last is a full slice of movie_ids
+        cursor['next_index'] = min(start_index + totals['batches'] * STREAM_BATCH_SIZE,
+                                   len(cursor['movie_ids']))
+        cursor['movies_fetched'] += len(batch['movies'])
+        cursor['batches_loaded'] += 1
+        save_cursor(store, cursor)
+
+    print("Streaming extract -> transform -> load...")
+    batches = transform_batches(stream_extract_data(STREAM_BATCH_SIZE, cursor, deadline.expired))
+    totals = load_batches(batches, on_batch_loaded=on_batch_loaded, should_stop=deadline.expired)
+
+    finished = cursor.get('extract_complete') and cursor['next_index'] >= len(cursor['movie_ids'])
+    if not finished:
+        # Out of time: leave the cursor for the next invocation
+        save_cursor(store, cursor)
+        print(f"⏸️ Deadline reached after {totals['batches']} batches, cursor saved")
+        return {
+            'statusCode' : 202,
+            'body' : json.dumps({
+                'message' : 'ETL pipeline paused before timeout',
+                'status' : 'continue',
+                'movies_processed' : totals['movies'],
+                'batches_loaded' : totals['batches'],
+                'rows' : totals['rows'],
+                'key_cache' : key_cache_stats(reset=True),
+                'db_connection' : connection_stats(reset=True),
+                'cursor' : {k: v for k, v in cursor.items() if k != 'movie_ids'}
+            })
+        }
+
+    store.delete(PIPELINE_CURSOR_KEY)
+    print(f"✅ Loaded {totals['movies']} movies in {totals['batches']} batches")
+
+    return {
+        'statusCode' : 200,
+        'body' : json.dumps({
+            'message' : 'ETL pipeline completed successfully',
+            'status' : 'complete',
+            'movies_processed' : totals['movies'],
+            'movies_changed' : totals['movies_changed'],
+            'movies_unchanged' : totals['movies_unchanged'],
+            'batches_loaded' : totals['batches'],
+            'rows' : totals['rows'],
+            'key_cache' : key_cache_stats(reset=True),
+            'db_connection' : connection_stats(reset=True)
+        })
+    }
+
+def run_compaction(event):
+    '''Compact yesterday's (or the requested days') raw objects into Parquet'''
+    from compact import compact_data
+
+    start_date = date.fromisoformat(event['date']) if 'date' in event else date.today() - timedelta(days=1)
+    end_date = date.fromisoformat(event['end_date']) if 'end_date' in event else start_date
+    results = compact_data(start_date, end_date, force=event.get('force', False))
+
+    return {
+        'statusCode' : 200,
+        'body' : json.dumps({
+            'message' : 'Compaction completed successfully',
+            'partitions' : results
+        })
+    }
+
+def run_migrations(event):
+    '''Apply pending schema migrations and report sequential scans in the dashboard queries'''
+    from migrations import migrate
+
+    result = migrate(check=event.get('check', True))
+
+    return {
+        'statusCode' : 200,
+        'body' : json.dumps(dict(result, message='Migrations completed successfully'))
+    }
+
+def run_retention(event):
+    '''Archive and drop daily_stats partitions older than the retention window'''
+    from partitions import apply_retention
+
+    kwargs = {'keep_months' : event['keep_months']} if 'keep_months' in event else {}
+    archived = apply_retention(**kwargs)
+
+    return {
+        'statusCode' : 200,
+        'body' : json.dumps({
+            'message' : 'Retention completed successfully',
+            'archived' : archived
+        })
+    }
+
+def run_crawl(event):
+    '''Crawl the next shards of the full catalog from TMDB's daily ID export'''
+    from crawl import crawl_data
+
+    export_date = date.fromisoformat(event['export_date']) if 'export_date' in event else None
+    kwargs = {'max_shards' : event['shards']} if 'shards' in event else {}
+    result = crawl_data(export_date, **kwargs)
+
+    return {
+        'statusCode' : 200,
+        'body' : json.dumps({
+            'message' : 'Crawl step completed successfully',
+            'export_date' : result['export_date'],
+            'shards_crawled' : len(result['shards']),
+            'remaining_shards' : result['remaining_shards']
+        })
+    }
+
+def run_coordinator(event):
+    '''Split the run into shards, fan them out to worker invocations and load the results'''
+    from fanout import coordinate
+
+    report = coordinate(pages=event.get('pages'), movie_ids=event.get('movie_ids'))
+
+    return {
+        'statusCode' : 200 if not report['failed_shards'] else 207,
+        'body' : json.dumps(dict(report, message='Fan-out ETL completed'))
+    }
+
+def run_fanout_worker(event):
+    '''Extract and transform one shard for the coordinator'''
+    from fanout import run_worker
+
+    return {
+        'statusCode' : 200,
+        'body' : json.dumps({'transformed' : run_worker(event['shard'])})
+    }
\ No newline at end of file
@@ -1,41 +1,531 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from collections import Counter, OrderedDict
 import psycopg2
+import psycopg2.errors
 from psycopg2.extras import RealDictCursor, execute_values
-from config.config import DB_CONFIG
+from config.config import (
+    DB_CONFIG, STREAM_PREFETCH, CHANGE_DETECTION, DERIVED_METRICS, COPY_THRESHOLD, KEY_CACHE_SIZE,
+    DB_CONNECTION_MODE, DB_VALIDATE_AFTER_SECONDS, DB_CONNECT_TIMEOUT, DAILY_STATS_PARTITIONING,
+    HOURLY_STATS, DASHBOARD_AGGREGATES
+)
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from migrations import ensure_schema
+from partitions import DailyStatsPartitions
+from models import SUB_RESOURCES
+
+# One snapshot date at a time, ranked within the day and diffed against each
+# movie's previous snapshot (whose rank is already in movie_metrics)
+REFRESH_METRICS_SQL = """
+    WITH ranked AS (
+        SELECT movie_id, date, popularity, vote_count,
+               RANK() OVER (ORDER BY popularity DESC) AS popularity_rank
+        FROM daily_stats
+        WHERE date = %(date)s
+    )
+    INSERT INTO movie_metrics (movie_id, date, profit, roi, popularity_rank, previous_date,
+                               popularity_delta, vote_count_delta, rank_change)
+    SELECT r.movie_id, r.date,
+           CASE WHEN m.budget > 0 AND m.revenue > 0 THEN m.revenue - m.budget END,
+           CASE WHEN m.budget > 0 AND m.revenue > 0
+                THEN ROUND((m.revenue - m.budget)::numeric / m.budget, 4) END,
+           r.popularity_rank, p.date,
+           r.popularity - p.popularity, r.vote_count - p.vote_count,
+           p.popularity_rank - r.popularity_rank
+    FROM ranked r
+    JOIN movies m ON m.id = r.movie_id
+    LEFT JOIN LATERAL (
+        SELECT mm.date, mm.popularity_rank, ds.popularity, ds.vote_count
+        FROM movie_metrics mm
+        JOIN daily_stats ds ON ds.movie_id = mm.movie_id AND ds.date = mm.date
+        WHERE mm.movie_id = r.movie_id AND mm.date < r.date
+        ORDER BY mm.date DESC
+        LIMIT 1
+    ) p ON TRUE
+    ON CONFLICT (movie_id, date)
+    DO UPDATE SET
+        profit = EXCLUDED.profit,
+        roi = EXCLUDED.roi,
+        popularity_rank = EXCLUDED.popularity_rank,
+        previous_date = EXCLUDED.previous_date,
+        popularity_delta = EXCLUDED.popularity_delta,
+        vote_count_delta = EXCLUDED.vote_count_delta,
+        rank_change = EXCLUDED.rank_change
+    WHERE (movie_metrics.profit, movie_metrics.roi, movie_metrics.popularity_rank,
+           movie_metrics.previous_date, movie_metrics.popularity_delta,
+           movie_metrics.vote_count_delta, movie_metrics.rank_change)
+          IS DISTINCT FROM
+          (EXCLUDED.profit, EXCLUDED.roi, EXCLUDED.popularity_rank, EXCLUDED.previous_date,
+           EXCLUDED.popularity_delta, EXCLUDED.vote_count_delta, EXCLUDED.rank_change)
+"""
+
+# RETURNING column telling a fresh row from an updated one: only an updated row has an xmax
+# (not readable on partitioned tables, see load_daily_stats)
+ROW_ACTION = "CASE WHEN xmax = 0 THEN 'inserted' ELSE 'updated' END"
+
+# Upsert into daily_stats from an `incoming` SELECT of (movie_id, date, popularity, vote_average,
+# vote_count, popularity_high, popularity_low, hourly_snapshots). Re-running a day rewrites only
+# the stats that moved. daily_stats may be partitioned, where RETURNING can't read xmax, so
+# rows that existed before the statement are looked up instead.
+DAILY_STATS_UPSERT = """
+    WITH incoming (movie_id, date, popularity, vote_average, vote_count,
+                   popularity_high, popularity_low, hourly_snapshots) AS ({incoming}
+    ), upserted AS (
+        INSERT INTO daily_stats (movie_id, date, popularity, vote_average, vote_count,
+                                 popularity_high, popularity_low, hourly_snapshots)
+        SELECT * FROM incoming
+        ON CONFLICT (movie_id, date)
+        DO UPDATE SET
+            popularity = EXCLUDED.popularity,
+            vote_average = EXCLUDED.vote_average,
+            vote_count = EXCLUDED.vote_count,
+            popularity_high = COALESCE(EXCLUDED.popularity_high, daily_stats.popularity_high),
+            popularity_low = COALESCE(EXCLUDED.popularity_low, daily_stats.popularity_low),
+            hourly_snapshots = COALESCE(EXCLUDED.hourly_snapshots, daily_stats.hourly_snapshots)
+        WHERE (daily_stats.popularity, daily_stats.vote_average, daily_stats.vote_count,
+               daily_stats.popularity_high, daily_stats.popularity_low, daily_stats.hourly_snapshots)
+              IS DISTINCT FROM
+              (EXCLUDED.popularity, EXCLUDED.vote_average, EXCLUDED.vote_count,
+               COALESCE(EXCLUDED.popularity_high, daily_stats.popularity_high),
+               COALESCE(EXCLUDED.popularity_low, daily_stats.popularity_low),
+               COALESCE(EXCLUDED.hourly_snapshots, daily_stats.hourly_snapshots))
+        RETURNING movie_id, date
+    )
+    SELECT CASE WHEN ds.movie_id IS NULL THEN 'inserted' ELSE 'updated' END
+    FROM upserted u
+    LEFT JOIN daily_stats ds ON ds.movie_id = u.movie_id AND ds.date = u.date
+"""
+
+# One snapshot date at a time: the genre and overall averages the dashboard reads.
+# Genres that no longer have movies on that date lose their row.
+REFRESH_AGGREGATES_SQL = """
+    WITH genre_stats AS (
+        SELECT ds.date, mg.genre_id, COUNT(*) AS movie_count,
+               ROUND(AVG(ds.popularity), 4) AS avg_popularity,
+               ROUND(AVG(ds.vote_average), 4) AS avg_vote_average
+        FROM daily_stats ds
+        JOIN movie_genres mg ON mg.movie_id = ds.movie_id
+        WHERE ds.date = %(date)s
+        GROUP BY ds.date, mg.genre_id
+    ), removed AS (
+        DELETE FROM genre_daily_stats gds
+        WHERE gds.date = %(date)s
+          AND NOT EXISTS (SELECT 1 FROM genre_stats s WHERE s.genre_id = gds.genre_id)
+    ), genres_upserted AS (
+        INSERT INTO genre_daily_stats (date, genre_id, movie_count, avg_popularity, avg_vote_average)
+        SELECT * FROM genre_stats
+        ON CONFLICT (date, genre_id)
+        DO UPDATE SET
+            movie_count = EXCLUDED.movie_count,
+            avg_popularity = EXCLUDED.avg_popularity,
+            avg_vote_average = EXCLUDED.avg_vote_average
+        WHERE (genre_daily_stats.movie_count, genre_daily_stats.avg_popularity, genre_daily_stats.avg_vote_average)
+              IS DISTINCT FROM (EXCLUDED.movie_count, EXCLUDED.avg_popularity, EXCLUDED.avg_vote_average)
+    )
+    INSERT INTO daily_summary (date, movie_count, avg_popularity, avg_rating)
+    SELECT date, COUNT(*), ROUND(AVG(popularity), 4), ROUND(AVG(vote_average), 4)
+    FROM daily_stats
+    WHERE date = %(date)s
+    GROUP BY date
+    ON CONFLICT (date)
+    DO UPDATE SET
+        movie_count = EXCLUDED.movie_count,
+        avg_popularity = EXCLUDED.avg_popularity,
+        avg_rating = EXCLUDED.avg_rating
+    WHERE (daily_summary.movie_count, daily_summary.avg_popularity, daily_summary.avg_rating)
+          IS DISTINCT FROM (EXCLUDED.movie_count, EXCLUDED.avg_popularity, EXCLUDED.avg_rating)
+"""
+
+# Rows per statement for the set-based loads (execute_values defaults to 100)
+BULK_PAGE_SIZE = 1000
+
+# Staging column types of the core tables, in load order
+MOVIE_COLUMNS = [
+    ('tmdb_id', 'integer'), ('title', 'varchar'), ('release_date', 'date'), ('overview', 'text'),
+    ('poster_path', 'varchar'), ('backdrop_path', 'varchar'), ('original_language', 'varchar'),
+    ('runtime', 'integer'), ('budget', 'bigint'), ('revenue', 'bigint')
+]
+STAT_COLUMNS = [
+    ('tmdb_movie_id', 'integer'), ('date', 'date'), ('popularity', 'decimal'),
+    ('vote_average', 'decimal'), ('vote_count', 'integer')
+]
+
+# Per-movie tables that can be skipped when a movie hasn't changed, with their tmdb id column
+MOVIE_CONTENT_TABLES = {
+    'movies' : 'tmdb_id',
+    'movie_genres' : 'tmdb_movie_id',
+    'credits' : 'tmdb_movie_id',
+    'release_dates' : 'tmdb_movie_id',
+    'keywords' : 'tmdb_movie_id',
+    'external_ids' : 'tmdb_movie_id',
+    'sub_resources' : 'tmdb_movie_id'
+}
+
+def as_rows(data, columns):
+    '''Row tuples of `columns` from a list of dicts'''
+    return [tuple(row[name] for name in columns) for row in data]
+
+def drop_movies(data, id_column, tmdb_ids):
+    '''Remove rows belonging to the given tmdb ids'''
+    return [row for row in data if row[id_column] not in tmdb_ids]
+
+def copy_value(value):
+    '''Render one value in COPY's text format'''
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+class CopyStream:
+    '''File-like reader that renders rows as COPY text lines as they are read'''
+    def __init__(self, rows):
+        self.lines = ('\t'.join(map(copy_value, row)) + '\n' for row in rows)
+        self.buffer = ''
+
+    def read(self, size=-1):
+        chunks = [self.buffer]
+        length = len(self.buffer)
+        while size < 0 or length < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+        data = ''.join(chunks)
+        if size < 0:
+            self.buffer = ''
+            return data
+        self.buffer = data[size:]
+        return data[:size]
+
+class KeyCache:
+    '''Bounded LRU of natural key -> surrogate id, kept by warm containers between invocations
+
+    The ids belong to one database; `bind` drops them when the loader connects
+    to a different one (or to tables that were recreated or truncated).
+    '''
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.ids = OrderedDict()
+        self.database = None
+        self.stats = {'hits' : 0, 'misses' : 0, 'evictions' : 0, 'invalidations' : 0}
+
+    def bind(self, database):
+        if database != self.database:
+            if self.database is not None:
+                self.invalidate()
+            self.database = database
+
+    def get_many(self, keys):
+        '''Return ({key: id} for cached keys, [keys that need a lookup])'''
+        found, missing = {}, []
+        for key in keys:
+            if key in self.ids:
+                self.ids.move_to_end(key)
+                found[key] = self.ids[key]
+            else:
+                missing.append(key)
+        self.stats['hits'] += len(found)
+        self.stats['misses'] += len(missing)
+        return found, missing
+
+    def put_many(self, pairs):
+        for key, surrogate_id in pairs:
+            self.ids[key] = surrogate_id
+            self.ids.move_to_end(key)
+        while len(self.ids) > self.max_size:
+            self.ids.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def invalidate(self):
+        '''Forget every id, e.g. after a cached one turned out to be gone'''
+        self.ids.clear()
+        self.stats['invalidations'] += 1
+
+    def get_stats(self, reset=False):
+        stats = dict(self.stats, entries=len(self.ids))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        if reset:
+            self.stats = dict.fromkeys(self.stats, 0)
+        return stats
+
+# Module level so warm Lambda containers reuse them across invocations
+movie_keys = KeyCache(KEY_CACHE_SIZE)
+genre_keys = KeyCache(KEY_CACHE_SIZE)
+
+# Cluster, database and the movies/genres storage files: a rebuilt database differs in at least one
+DATABASE_IDENTITY_SQL = """
+    SELECT (SELECT system_identifier FROM pg_control_system()), current_database(),
+           pg_relation_filenode('movies'), pg_relation_filenode('genres')
+"""
+
+def bind_key_caches(connection):
+    '''Point the key caches at the database behind `connection`, clearing them if it changed'''
+    cursor = connection.cursor()
+    cursor.execute(DATABASE_IDENTITY_SQL)
+    database = cursor.fetchone()
+    connection.commit()
+    movie_keys.bind(database)
+    genre_keys.bind(database)
+
+def key_cache_stats(reset=False):
+    '''Hit/miss counters of the surrogate-key caches (hits are lookups saved)'''
+    return {'movies' : movie_keys.get_stats(reset), 'genres' : genre_keys.get_stats(reset)}
+
+def add_row_counts(totals, counts):
+    '''Add per-table inserted/updated/unchanged counts into running totals'''
+    for table, table_counts in counts.items():
+        total = totals.setdefault(table, dict.fromkeys(table_counts, 0))
+        for action, count in table_counts.items():
+            total[action] = total.get(action, 0) + count
+    return totals
+
+class ConnectionManager:
+    '''Hands out database connections, keeping one open across warm invocations
+
+    In 'reuse' mode the idle connection survives between runs and is checked before
+    it's handed out again: a closed or broken connection is replaced, and one idle
+    for longer than validate_after seconds gets a SELECT 1 first. A loader asking
+    while it's taken gets an extra connection that is closed on release.
+
+    In 'pooler' mode every connection is opened per run and closed on release so
+    PgBouncer or RDS Proxy decides how backends are shared. The loader keeps no
+    session state outside a transaction (staging tables are ON COMMIT DROP), so
+    transaction pooling is safe.
+    '''
+    def __init__(self, mode=DB_CONNECTION_MODE, validate_after=DB_VALIDATE_AFTER_SECONDS):
+        self.mode = mode
+        self.validate_after = validate_after
+        self.idle = None
+        self.idle_since = 0.0
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.stats = {'connects' : 0, 'reuses' : 0, 'reconnects' : 0, 'setup_seconds' : 0.0}
+
+    def open(self):
+        options = {'connect_timeout' : DB_CONNECT_TIMEOUT}
+        if self.mode == 'reuse':
+            # Let the OS notice dead peers on connections kept between invocations
+            options.update(keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+        connection = psycopg2.connect(**dict(options, **DB_CONFIG))
+        self.stats['connects'] += 1
+        return connection
+
+    def healthy(self, connection):
+        '''Cheap check: local status first, a round trip only after a long idle'''
+        if connection.closed:
+            return False
+        try:
+            status = connection.get_transaction_status()
+            if status == TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            if time.monotonic() - self.idle_since > self.validate_after:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                connection.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def acquire(self):
+        started = time.perf_counter()
+        with self.lock:
+            connection, self.idle = self.idle, None
+            if self.pid != os.getpid():
+                # A forked worker must not share its parent's socket; leave it to the parent
+                connection, self.pid = None, os.getpid()
+        if connection is not None:
+            if self.healthy(connection):
+                self.stats['reuses'] += 1
+            else:
+                print("Stale database connection, reconnecting")
+                self.discard(connection)
+                self.stats['reconnects'] += 1
+                connection = None
+        if connection is None:
+            connection = self.open()
+        self.stats['setup_seconds'] += time.perf_counter() - started
+        return connection
+
+    def release(self, connection):
+        if connection.closed:
+            return
+        if self.mode == 'reuse':
+            try:
+                connection.rollback()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                self.discard(connection)
+                return
+            with self.lock:
+                if self.idle is None:
+                    self.idle, self.idle_since = connection, time.monotonic()
+                    return
+        connection.close()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def get_stats(self, reset=False):
+        stats = dict(self.stats, mode=self.mode, setup_ms=round(self.stats['setup_seconds'] * 1000, 1))
+        del stats['setup_seconds']
+        if reset:
+            self.stats.update(connects=0, reuses=0, reconnects=0, setup_seconds=0.0)
+        return stats
+
+# Outlives a single handler call so warm invocations skip the connection handshake
+db_connections = ConnectionManager()
+
+def connection_stats(reset=False):
+    '''Connections opened and reused, and time spent getting them, since the last reset'''
+    return db_connections.get_stats(reset)
 
 class DatabaseLoader:
     def __init__(self):
         self.connection = None
+        self.loaded_dates = set()
+        self.row_counts = {}
+        self.copy_threshold = COPY_THRESHOLD
         self.connect()
+        # Every table the loader writes is created by the migrations
+        ensure_schema(self.connection)
+        bind_key_caches(self.connection)
+        if DAILY_STATS_PARTITIONING:
+            self.partitions = DailyStatsPartitions(self.connection)
+        else:
+            self.partitions = DailyStatsPartitions.detect(self.connection)
         pass
 
     def connect(self):
         '''Connect to PostgreSQL database'''
         try:
-            self.connection = psycopg2.connect(**DB_CONFIG)
+            self.connection = db_connections.acquire()
             print("Database Connection successful")
         except Exception as e:
             print(f"Error connecting to database: {e}")
             raise
 
+    def upsert_rows(self, table, query, columns, rows, returning=False, page_size=BULK_PAGE_SIZE):
+        '''Run an INSERT ... SELECT ... FROM {source} over rows given as (name, sql type) columns
+
+        Up to `copy_threshold` rows go through execute_values, `page_size` rows per
+        statement; bigger loads are streamed with COPY into a temporary staging
+        table and merged from there. With `returning` the rows of the query's
+        RETURNING clause are returned.
+        '''
+        cursor = self.connection.cursor()
+        names = ', '.join(name for name, _ in columns)
+
+        if len(rows) >= self.copy_threshold:
+            staging = f"staging_{table}"
+            cursor.execute(
+                f"CREATE TEMP TABLE {staging} ({', '.join(f'{name} {sql_type}' for name, sql_type in columns)})"
+                f" ON COMMIT DROP"
+            )
+            cursor.copy_expert(f"COPY {staging} ({names}) FROM STDIN", CopyStream(rows))
+            # Temp tables are never auto-analyzed; without stats the merge join is guessed
+            cursor.execute(f"ANALYZE {staging}")
+            cursor.execute(query.format(source=f"{staging} AS v"))
+            return cursor.fetchall() if returning else None
+
+        template = '(' + ', '.join(f'%s::{sql_type}' for _, sql_type in columns) + ')'
+        return execute_values(cursor, query.format(source=f"(VALUES %s) AS v ({names})"), rows,
+                              template=template, page_size=page_size, fetch=returning)
+
+    def resolve_ids(self, cache, table, key_column, keys):
+        '''Map natural keys to surrogate ids: cache first, one lookup query for the misses'''
+        found, missing = cache.get_many(set(keys))
+        if missing:
+            cursor = self.connection.cursor()
+            cursor.execute(f"SELECT {key_column}, id FROM {table} WHERE {key_column} = ANY(%s)", (missing,))
+            looked_up = cursor.fetchall()
+            cache.put_many(looked_up)
+            found.update(looked_up)
+        return found
+
+    def upsert_resolved(self, table, query, columns, build_rows, key=None, page_size=BULK_PAGE_SIZE):
+        '''upsert_rows over rows built from cached surrogate ids, redone once if a cached id is stale
+
+        The query returns one action per row it wrote (see count_rows); rows are
+        told apart by the columns at the `key` indexes, all of them by default.
+        '''
+        cursor = self.connection.cursor()
+        cursor.execute("SAVEPOINT resolved_ids")
+        try:
+            rows = build_rows()
+            returned = self.upsert_rows(table, query, columns, rows, returning=True, page_size=page_size)
+        except psycopg2.errors.ForeignKeyViolation:
+            # bind_key_caches rules out another database, so a bad cached id is a row deleted since
+            # it was cached: look them all up again
+            print(f"Stale surrogate key while loading {table}, invalidating key caches")
+            cursor.execute("ROLLBACK TO SAVEPOINT resolved_ids")
+            movie_keys.invalidate()
+            genre_keys.invalidate()
+            rows = build_rows()
+            returned = self.upsert_rows(table, query, columns, rows, returning=True, page_size=page_size)
+        cursor.execute("RELEASE SAVEPOINT resolved_ids")
+        keys = {tuple(row[i] for i in key) for row in rows} if key else set(rows)
+        return self.count_rows(table, returned, len(keys))
+
+    def count_rows(self, table, returned, submitted):
+        '''Tally the actions in the last column of RETURNING rows for `submitted` distinct rows
+
+        Rows an upsert skipped because nothing changed aren't returned, so whatever
+        wasn't inserted or updated is counted as unchanged.
+        '''
+        actions = Counter(row[-1] for row in returned or [])
+        counts = {
+            'inserted' : actions['inserted'],
+            'updated' : actions['updated'],
+            'unchanged' : submitted - actions['inserted'] - actions['updated']
+        }
+        if actions['deleted']:
+            counts['deleted'] = actions['deleted']
+        add_row_counts(self.row_counts, {table : counts})
+        return counts
+
     def load_genres(self, genres_data):
         '''Load genres with upsert logic'''
         if not genres_data:
             return
-        
-        cursor = self.connection.cursor()
 
         # Upsert genres
-        insert_query = """
-            INSERT INTO genres (tmdb_genre_id, name)
-            VALUES %s
-            ON CONFLICT (tmdb_genre_id)
-            DO UPDATE SET name = EXCLUDED.name
+        # Unchanged genres aren't written, but their ids are still returned for the key cache
+        insert_query = f"""
+            WITH incoming AS (
+                SELECT DISTINCT ON (v.tmdb_genre_id) v.tmdb_genre_id, v.name
+                FROM {{source}}
+            ), upserted AS (
+                INSERT INTO genres (tmdb_genre_id, name)
+                SELECT tmdb_genre_id, name FROM incoming
+                ON CONFLICT (tmdb_genre_id)
+                DO UPDATE SET name = EXCLUDED.name
+                WHERE genres.name IS DISTINCT FROM EXCLUDED.name
+                RETURNING tmdb_genre_id, id, {ROW_ACTION}
+            )
+            SELECT * FROM upserted
+            UNION ALL
+            SELECT g.tmdb_genre_id, g.id, 'unchanged'
+            FROM genres g JOIN incoming i ON i.tmdb_genre_id = g.tmdb_genre_id
+            WHERE NOT EXISTS (SELECT 1 FROM upserted u WHERE u.tmdb_genre_id = g.tmdb_genre_id)
         """
 
-        values = [(g['tmdb_genre_id'], g['name']) for g in genres_data]
-        execute_values(cursor, insert_query, values)
+        values = as_rows(genres_data, ('tmdb_genre_id', 'name'))
+        returned = self.upsert_rows(
+            'genres', insert_query, [('tmdb_genre_id', 'integer'), ('name', 'varchar')], values, returning=True
+        )
+        genre_keys.put_many(row[:2] for row in returned)
+        counts = self.count_rows('genres', returned, len({row[0] for row in values}))
         self.connection.commit()
-        print(f"Loaded {len(genres_data)} genres")
+        print(f"Loaded {len(genres_data)} genres {counts}")
 
 
     def load_movies(self, movies_data):
@@ -43,116 +533,497 @@ class DatabaseLoader:
         if not movies_data:
             return
 
-        cursor = self.connection.cursor()
-
-        insert_query = """
-            INSERT INTO movies (tmdb_id, title, release_date, overview, poster_path, 
-                              backdrop_path, original_language, runtime, budget, revenue) 
-            VALUES %s 
-            ON CONFLICT (tmdb_id) 
-            DO UPDATE SET 
-                title = EXCLUDED.title,
-                release_date = EXCLUDED.release_date,
-                overview = EXCLUDED.overview,
-                poster_path = EXCLUDED.poster_path,
-                backdrop_path = EXCLUDED.backdrop_path,
-                original_language = EXCLUDED.original_language,
-                runtime = EXCLUDED.runtime,
-                budget = EXCLUDED.budget,
-                revenue = EXCLUDED.revenue,
-                updated_at = CURRENT_TIMESTAMP
+        # A movie repeated in one load would make the upsert touch its row twice.
+        # Identical movies keep their row (and updated_at); their ids still come back.
+        insert_query = f"""
+            WITH incoming AS (
+                SELECT DISTINCT ON (v.tmdb_id)
+                    v.tmdb_id, v.title, v.release_date, v.overview, v.poster_path,
+                    v.backdrop_path, v.original_language, v.runtime, v.budget, v.revenue
+                FROM {{source}}
+            ), upserted AS (
+                INSERT INTO movies (tmdb_id, title, release_date, overview, poster_path, 
+                                  backdrop_path, original_language, runtime, budget, revenue) 
+                SELECT * FROM incoming
+                ON CONFLICT (tmdb_id) 
+                DO UPDATE SET 
+                    title = EXCLUDED.title,
+                    release_date = EXCLUDED.release_date,
+                    overview = EXCLUDED.overview,
+                    poster_path = EXCLUDED.poster_path,
+                    backdrop_path = EXCLUDED.backdrop_path,
+                    original_language = EXCLUDED.original_language,
+                    runtime = EXCLUDED.runtime,
+                    budget = EXCLUDED.budget,
+                    revenue = EXCLUDED.revenue,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE (movies.title, movies.release_date, movies.overview, movies.poster_path,
+                       movies.backdrop_path, movies.original_language, movies.runtime,
+                       movies.budget, movies.revenue)
+                      IS DISTINCT FROM
+                      (EXCLUDED.title, EXCLUDED.release_date, EXCLUDED.overview, EXCLUDED.poster_path,
+                       EXCLUDED.backdrop_path, EXCLUDED.original_language, EXCLUDED.runtime,
+                       EXCLUDED.budget, EXCLUDED.revenue)
+                RETURNING tmdb_id, id, {ROW_ACTION}
+            )
+            SELECT * FROM upserted
+            UNION ALL
+            SELECT m.tmdb_id, m.id, 'unchanged'
+            FROM movies m JOIN incoming i ON i.tmdb_id = m.tmdb_id
+            WHERE NOT EXISTS (SELECT 1 FROM upserted u WHERE u.tmdb_id = m.tmdb_id)
         """
 
-        values = [(
-            m['tmdb_id'], m['title'], m['release_date'], m['overview'],
-            m['poster_path'], m['backdrop_path'], m['original_language'],
-            m['runtime'], m['budget'], m['revenue']
-        ) for m in movies_data]
-        execute_values(cursor, insert_query, values)
+        values = as_rows(movies_data, [name for name, _ in MOVIE_COLUMNS])
+        returned = self.upsert_rows('movies', insert_query, MOVIE_COLUMNS, values, returning=True)
+        movie_keys.put_many(row[:2] for row in returned)
+        counts = self.count_rows('movies', returned, len({row[0] for row in values}))
         self.connection.commit()
-        print(f"Loaded {len(movies_data)} movies")
+        print(f"Loaded {len(movies_data)} movies {counts}")
 
 
     def load_movie_genres(self, movie_genres_data):
         '''Load movie-genre relationships'''
         if not movie_genres_data:
             return
-        
+
+        insert_query = f"""
+            INSERT INTO movie_genres (movie_id, genre_id)
+            SELECT v.movie_id, v.genre_id
+            FROM {{source}}
+            ON CONFLICT (movie_id, genre_id) DO NOTHING
+            RETURNING {ROW_ACTION}
+        """
+        values = as_rows(movie_genres_data, ('tmdb_movie_id', 'tmdb_genre_id'))
+
+        def build_rows():
+            # Relationships of movies or genres that aren't in the database are skipped
+            movie_ids = self.resolve_ids(movie_keys, 'movies', 'tmdb_id', [v[0] for v in values])
+            genre_ids = self.resolve_ids(genre_keys, 'genres', 'tmdb_genre_id', [v[1] for v in values])
+            return [(movie_ids[movie], genre_ids[genre]) for movie, genre in values
+                    if movie in movie_ids and genre in genre_ids]
+
+        counts = self.upsert_resolved('movie_genres', insert_query,
+                                      [('movie_id', 'integer'), ('genre_id', 'integer')], build_rows)
+        self.connection.commit()
+        print(f"Loaded {len(values)} movie-genre relationships {counts}")
+
+
+    def load_daily_stats(self, stats_data, captured_at=None):
+        '''Load daily stats (today's captured at `captured_at`, by default now)'''
+        if not stats_data:
+            return
+
+        stat_rows = as_rows(stats_data, [name for name, _ in STAT_COLUMNS])
+        self.loaded_dates.update(row[1] for row in stat_rows)
+
+        # One row per movie and day, or the upsert would hit the same row twice
+        values = list({(row[0], row[1]): row for row in stat_rows}.values())
+        if self.partitions:
+            self.partitions.ensure({row[1] for row in values})
+
+        # Today's stats go through hourly_stats; replays and backfills of past days are written as they come
+        today = datetime.now().date()
+        live, history = [], []
+        for v in values:
+            (live if HOURLY_STATS and str(v[1]) == today.isoformat() else history).append(v)
+
+        if history:
+            direct = DAILY_STATS_UPSERT.format(incoming="""
+                SELECT v.movie_id, v.date, v.popularity, v.vote_average, v.vote_count,
+                       NULL::decimal, NULL::decimal, NULL::smallint
+                FROM {source}""")
+
+            def build_rows():
+                movie_ids = self.resolve_ids(movie_keys, 'movies', 'tmdb_id', [v[0] for v in history])
+                return [(movie_ids[v[0]],) + v[1:] for v in history if v[0] in movie_ids]
+
+            counts = self.upsert_resolved('daily_stats', direct,
+                                          [('movie_id', 'integer')] + STAT_COLUMNS[1:], build_rows, key=(0, 1))
+            print(f"Loaded {len(history)} daily stats {counts}")
+
+        if live:
+            self.load_hourly_stats(live, today, captured_at)
+        self.connection.commit()
+
+    def load_hourly_stats(self, values, day, captured_at=None):
+        '''Add this run's stats to hourly_stats, then roll the day's hours up into daily_stats
+
+        A movie keeps one snapshot per hour: a retried batch or a replayed object
+        for an hour that is already there is skipped.
+        '''
+        captured_at = captured_at or datetime.now()
+        insert_query = """
+            INSERT INTO hourly_stats (captured_at, movie_id, popularity_milli, vote_count, vote_average_milli)
+            SELECT v.captured_at, v.movie_id, ROUND(v.popularity * 1000), v.vote_count, ROUND(v.vote_average * 1000)
+            FROM {source}
+            ON CONFLICT (movie_id, date_trunc('hour', captured_at)) DO NOTHING
+            RETURNING 'inserted'
+        """
+        appended = []
+
+        def build_rows():
+            movie_ids = self.resolve_ids(movie_keys, 'movies', 'tmdb_id', [v[0] for v in values])
+            rows = [(captured_at, movie_ids[v[0]]) + v[2:] for v in values if v[0] in movie_ids]
+            appended[:] = [row[1] for row in rows]
+            return rows
+
+        self.upsert_resolved('hourly_stats', insert_query,
+                             [('captured_at', 'timestamp'), ('movie_id', 'integer')] + STAT_COLUMNS[2:], build_rows)
+
+        # The day so far: the latest hour's values, the popularity range and the hours seen
+        rollup = DAILY_STATS_UPSERT.format(incoming="""
+            SELECT movie_id, %(day)s::date,
+                   ROUND((ARRAY_AGG(popularity_milli ORDER BY captured_at DESC))[1] / 1000.0, 3),
+                   ROUND((ARRAY_AGG(vote_average_milli ORDER BY captured_at DESC))[1] / 1000.0, 3),
+                   (ARRAY_AGG(vote_count ORDER BY captured_at DESC))[1],
+                   ROUND(MAX(popularity_milli) / 1000.0, 3),
+                   ROUND(MIN(popularity_milli) / 1000.0, 3),
+                   COUNT(*)::smallint
+            FROM hourly_stats
+            WHERE captured_at >= %(day)s::date AND captured_at < %(day)s::date + 1
+              AND movie_id = ANY(%(movie_ids)s)
+            GROUP BY movie_id""")
         cursor = self.connection.cursor()
+        cursor.execute(rollup, {'day' : day, 'movie_ids' : appended})
+        counts = self.count_rows('daily_stats', cursor.fetchall(), len(appended))
+        print(f"Rolled {len(appended)} hourly stats up into daily_stats {counts}")
+
 
-        # First get movie and genre id's from database
-        for mg in movie_genres_data:
-            # Get movie ID 
+    def replace_movie_rows(self, table, columns, rows, key=(), movie_ids=None):
+        '''Replace the child rows of the movies in `movie_ids` with `rows` (tmdb_id first, then `columns`)
+
+        `movie_ids` are the tmdb ids fetched with this sub-resource (by default
+        the movies in `rows`); one that has no rows now loses all of them.
+        `key` names the columns that, with movie_id, make the table's primary key.
+        Rows that are already there and identical are left alone.
+        '''
+        movie_ids = set(movie_ids) if movie_ids is not None else {row[0] for row in rows}
+        emptied = movie_ids - {row[0] for row in rows}
+        if emptied:
+            # Nothing to upsert for these, so they can't go through the statement below
+            cursor = self.connection.cursor()
             cursor.execute(
-                "SELECT id FROM movies WHERE tmdb_id = %s",(mg['tmdb_movie_id'],)
+                f"""DELETE FROM {table} t USING movies m
+                    WHERE m.id = t.movie_id AND m.tmdb_id = ANY(%s)
+                    RETURNING 'deleted'""",
+                (sorted(emptied),)
             )
-            movie_result = cursor.fetchone()
+            counts = self.count_rows(table, cursor.fetchall(), 0)
+            if not rows:
+                self.connection.commit()
+                print(f"Cleared {table} for {len(emptied)} movies {counts}")
+        if not rows:
+            return
 
-            # Get genre ID
-            cursor.execute(
-                "SELECT id FROM genres WHERE tmdb_genre_id = %s",(mg['tmdb_genre_id'],)
+        names = [name for name, _ in columns]
+        key_names = ['movie_id'] + list(key)
+        values = [name for name in names if name not in key]
+        if values:
+            on_conflict = f"""DO UPDATE SET {', '.join(f'{name} = EXCLUDED.{name}' for name in values)}
+                WHERE ({', '.join('t.' + name for name in values)})
+                      IS DISTINCT FROM ({', '.join('EXCLUDED.' + name for name in values)})"""
+        else:
+            on_conflict = "DO NOTHING"
+
+        # Sub-resources are snapshots: rows the movie no longer has are dropped in the same statement
+        insert_query = f"""
+            WITH incoming AS (
+                SELECT DISTINCT ON ({', '.join('v.' + name for name in key_names)})
+                    v.movie_id, {', '.join('v.' + name for name in names)}
+                FROM {{source}}
+            ), removed AS (
+                DELETE FROM {table} t
+                WHERE t.movie_id IN (SELECT movie_id FROM incoming)
+                  AND NOT EXISTS (SELECT 1 FROM incoming i
+                                  WHERE {' AND '.join(f'i.{name} = t.{name}' for name in key_names)})
+                RETURNING 'deleted'
+            ), upserted AS (
+                INSERT INTO {table} AS t (movie_id, {', '.join(names)})
+                SELECT * FROM incoming
+                ON CONFLICT ({', '.join(key_names)}) {on_conflict}
+                RETURNING {ROW_ACTION}
             )
-            genre_result = cursor.fetchone()
-
-            if movie_result and genre_result:
-                # Insert relationship
-                cursor.execute(
-                    """INSERT INTO movie_genres (movie_id, genre_id)
-                       VALUES (%s, %s)
-                       ON CONFLICT (movie_id, genre_id) DO NOTHING""",
-                       (movie_result[0], genre_result[0])
-                )
-            
+            SELECT * FROM upserted
+            UNION ALL
+            SELECT * FROM removed
+        """
+
+        def build_rows():
+            tmdb_ids = {row[0] for row in rows}
+            movie_ids = self.resolve_ids(movie_keys, 'movies', 'tmdb_id', tmdb_ids)
+            return [(movie_ids[row[0]],) + tuple(row[1:]) for row in rows if row[0] in movie_ids]
+
+        # One statement for all rows, or a movie split across pages would lose rows to the DELETE
+        # Built rows are (movie_id, *names); the key columns needn't come first
+        key_indexes = [0] + [1 + names.index(name) for name in key]
+        counts = self.upsert_resolved(table, insert_query, [('movie_id', 'integer')] + columns, build_rows,
+                                      key=key_indexes, page_size=max(len(rows), 1))
         self.connection.commit()
-        print(f"Loaded movie-genre relationships")
+        print(f"Loaded {len(rows)} rows into {table} {counts}")
 
+    def load_credits(self, credits_data, movie_ids=None):
+        '''Load cast and crew credits'''
+        self.replace_movie_rows(
+            'movie_credits',
+            [('tmdb_person_id', 'integer'), ('name', 'varchar'), ('credit_type', 'varchar'),
+             ('role', 'varchar'), ('credit_order', 'integer')],
+            [(c['tmdb_movie_id'], c['tmdb_person_id'], c['name'], c['credit_type'],
+              c['role'], c['credit_order']) for c in credits_data],
+            key=('tmdb_person_id', 'credit_type', 'role'),
+            movie_ids=movie_ids
+        )
 
-    def load_daily_stats(self, stats_data):
-        '''Load daily stats'''
-        if not stats_data:
+    def load_release_dates(self, release_dates_data, movie_ids=None):
+        '''Load per-country release dates'''
+        self.replace_movie_rows(
+            'movie_release_dates',
+            [('country', 'char(2)'), ('release_type', 'smallint'), ('release_date', 'date'),
+             ('certification', 'varchar')],
+            [(r['tmdb_movie_id'], r['country'], r['release_type'], r['release_date'],
+              r['certification']) for r in release_dates_data],
+            key=('country', 'release_type', 'release_date'),
+            movie_ids=movie_ids
+        )
+
+    def load_keywords(self, keywords_data, movie_ids=None):
+        '''Load movie keywords'''
+        self.replace_movie_rows(
+            'movie_keywords',
+            [('tmdb_keyword_id', 'integer'), ('name', 'varchar')],
+            [(k['tmdb_movie_id'], k['tmdb_keyword_id'], k['name']) for k in keywords_data],
+            key=('tmdb_keyword_id',),
+            movie_ids=movie_ids
+        )
+
+    def load_external_ids(self, external_ids_data, movie_ids=None):
+        '''Load IMDb/Wikidata/social IDs'''
+        self.replace_movie_rows(
+            'movie_external_ids',
+            [('imdb_id', 'varchar'), ('wikidata_id', 'varchar'), ('facebook_id', 'varchar'),
+             ('instagram_id', 'varchar'), ('twitter_id', 'varchar')],
+            [(e['tmdb_movie_id'], e['imdb_id'], e['wikidata_id'], e['facebook_id'],
+              e['instagram_id'], e['twitter_id']) for e in external_ids_data],
+            movie_ids=movie_ids
+        )
+
+    def skip_unchanged_movies(self, transformed_data):
+        '''Drop per-movie rows for movies whose fingerprint matches the stored one'''
+        fingerprints = transformed_data.get('fingerprints') or []
+        if not fingerprints:
+            return transformed_data, set()
+
+        # Only trust fingerprints of movies that are actually in the database
+        cursor = self.connection.cursor()
+        cursor.execute(
+            """SELECT f.tmdb_id, f.fingerprint FROM movie_fingerprints f
+               JOIN movies m ON m.tmdb_id = f.tmdb_id
+               WHERE f.tmdb_id = ANY(%s)""",
+            ([f['tmdb_id'] for f in fingerprints],)
+        )
+        stored = dict(cursor.fetchall())
+        unchanged = {f['tmdb_id'] for f in fingerprints if stored.get(f['tmdb_id']) == f['fingerprint']}
+        if not unchanged:
+            return transformed_data, unchanged
+
+        filtered = dict(transformed_data)
+        for table, id_column in MOVIE_CONTENT_TABLES.items():
+            filtered[table] = drop_movies(transformed_data.get(table, []), id_column, unchanged)
+        filtered['fingerprints'] = [f for f in fingerprints if f['tmdb_id'] not in unchanged]
+        return filtered, unchanged
+
+    def save_fingerprints(self, fingerprints):
+        '''Remember the content hash of every movie that was just loaded'''
+        if not fingerprints:
             return
-        
+
+        cursor = self.connection.cursor()
+        insert_query = """
+            INSERT INTO movie_fingerprints (tmdb_id, fingerprint)
+            VALUES %s
+            ON CONFLICT (tmdb_id)
+            DO UPDATE SET fingerprint = EXCLUDED.fingerprint, updated_at = CURRENT_TIMESTAMP
+            WHERE movie_fingerprints.fingerprint IS DISTINCT FROM EXCLUDED.fingerprint
+        """
+        execute_values(cursor, insert_query, [(f['tmdb_id'], f['fingerprint']) for f in fingerprints])
+        self.connection.commit()
+
+    def load_all(self, transformed_data):
+        '''Load one transformed dataset (a full run or a single batch)'''
+        unchanged = set()
+        self.row_counts = {}
+        if CHANGE_DETECTION:
+            transformed_data, unchanged = self.skip_unchanged_movies(transformed_data)
+
+        # Load in correct order due to foreign key dependencies
+        self.load_genres(transformed_data['genres'])
+        self.load_movies(transformed_data['movies'])
+        self.load_movie_genres(transformed_data['movie_genres'])
+        self.load_daily_stats(transformed_data['daily_stats'], transformed_data.get('captured_at'))
+
+        # Sub-resources from append_to_response, all children of movies. Payloads from before
+        # sub_resources was recorded only replace the rows of movies they have rows for.
+        fetched = None
+        if 'sub_resources' in transformed_data:
+            fetched = {name: set() for name in SUB_RESOURCES}
+            for entry in transformed_data['sub_resources']:
+                fetched[entry['sub_resource']].add(entry['tmdb_movie_id'])
+        if any(transformed_data.get(key) for key in SUB_RESOURCES + ('sub_resources',)):
+            self.load_credits(transformed_data.get('credits', []), fetched and fetched['credits'])
+            self.load_release_dates(transformed_data.get('release_dates', []), fetched and fetched['release_dates'])
+            self.load_keywords(transformed_data.get('keywords', []), fetched and fetched['keywords'])
+            self.load_external_ids(transformed_data.get('external_ids', []), fetched and fetched['external_ids'])
+
+        if CHANGE_DETECTION:
+            self.save_fingerprints(transformed_data.get('fingerprints'))
+
+        summary = {'movies_changed' : len(transformed_data['movies']), 'movies_unchanged' : len(unchanged)}
+        print(f"Change detection: {summary}")
+        return dict(summary, rows=self.row_counts)
+
+    def refresh_metrics(self):
+        '''Recompute movie_metrics for the snapshots loaded since the last refresh
+
+        Snapshots after the earliest loaded date are redone too, since their deltas
+        depend on it; a first run backfills every snapshot in daily_stats.
+        '''
+        if not DERIVED_METRICS:
+            return []
+
         cursor = self.connection.cursor()
+        cursor.execute("SELECT MAX(date) FROM movie_metrics")
+        computed_until = cursor.fetchone()[0]
+        cursor.execute(
+            """SELECT DISTINCT date FROM daily_stats
+               WHERE %(until)s IS NULL OR date > %(until)s OR date >= %(since)s
+               ORDER BY date""",
+            {'until' : computed_until, 'since' : min(self.loaded_dates) if self.loaded_dates else None}
+        )
+        dates = [row[0] for row in cursor.fetchall()]
+
+        for snapshot_date in dates:
+            cursor.execute(REFRESH_METRICS_SQL, {'date' : snapshot_date})
+        self.connection.commit()
+
+        if dates:
+            print(f"Refreshed movie metrics for {len(dates)} snapshot(s): {dates[0]} .. {dates[-1]}")
+        return dates
+
+    def refresh_aggregates(self):
+        '''Recompute genre_daily_stats and daily_summary for the snapshots loaded since the last refresh
 
-        for stat in stats_data:
-            # Get movie ID
+        Only those dates are touched; a first run (or one after missed refreshes)
+        also fills in every snapshot newer than the latest summary.
+        '''
+        if not DASHBOARD_AGGREGATES:
+            return []
+
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT MAX(date) FROM daily_summary")
+        summarised_until = cursor.fetchone()[0]
+        if summarised_until is None:
+            cursor.execute("SELECT DISTINCT date FROM daily_stats ORDER BY date")
+        else:
             cursor.execute(
-                "SELECT id FROM movies WHERE tmdb_id = %s", (stat['tmdb_movie_id'],)
+                """SELECT DISTINCT date FROM daily_stats
+                   WHERE date > %(until)s OR date = ANY(%(loaded)s::date[])
+                   ORDER BY date""",
+                {'until' : summarised_until, 'loaded' : sorted(map(str, self.loaded_dates))}
             )
-            movie_result = cursor.fetchone()
-
-            if movie_result:
-                cursor.execute(
-                    """INSERT INTO daily_stats (movie_id, date, popularity, vote_average, vote_count) 
-                       VALUES (%s, %s, %s, %s, %s) 
-                       ON CONFLICT (movie_id, date) 
-                       DO UPDATE SET 
-                           popularity = EXCLUDED.popularity,
-                           vote_average = EXCLUDED.vote_average,
-                           vote_count = EXCLUDED.vote_count""",
-                    (movie_result[0], stat['date'], stat['popularity'], 
-                     stat['vote_average'], stat['vote_count'])
-                )
+        dates = [row[0] for row in cursor.fetchall()]
 
+        for snapshot_date in dates:
+            cursor.execute(REFRESH_AGGREGATES_SQL, {'date' : snapshot_date})
         self.connection.commit()
-        print(f"Loaded {len(stats_data)} daily stats")
 
-    
+        if dates:
+            print(f"Refreshed dashboard aggregates for {len(dates)} snapshot(s): {dates[0]} .. {dates[-1]}")
+        return dates
+
+    def refresh_derived(self):
+        '''Bring the tables derived from daily_stats up to date with the snapshots just loaded'''
+        refreshed = {'metrics' : self.refresh_metrics(), 'aggregates' : self.refresh_aggregates()}
+        self.loaded_dates.clear()
+        return refreshed
+
     def close(self):
-        '''Close database connection'''
+        '''Hand the connection back to the manager, which may keep it for the next run'''
         if self.connection:
-            self.connection.close()
+            db_connections.release(self.connection)
+            self.connection = None
 
 def load_data(transformed_data):
     '''Main loading function'''
     loader = DatabaseLoader()
 
     try:
-        # Load in correct order due to foreign key dependencies
-        loader.load_genres(transformed_data['genres'])
-        loader.load_movies(transformed_data['movies'])
-        loader.load_movie_genres(transformed_data['movie_genres'])
-        loader.load_daily_stats(transformed_data['daily_stats'])
+        summary = loader.load_all(transformed_data)
+        loader.refresh_derived()
+        return summary
+    finally:
+        loader.close()
+
+def load_batches(transformed_batches, prefetch=STREAM_PREFETCH, on_batch_loaded=None, should_stop=None):
+    '''Load transformed batches as they arrive, producing the next ones in a background thread'''
+    batches = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    finished = object()
 
+    def offer(item):
+        '''Queue an item, giving up once the loader has stopped'''
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        # Extraction and transformation run here so API I/O overlaps the DB writes
+        try:
+            for batch in transformed_batches:
+                if not offer(batch):
+                    return
+            offer(finished)
+        except Exception as e:
+            offer(e)
+        finally:
+            if hasattr(transformed_batches, 'close'):
+                transformed_batches.close()
+
+    # Connect first: a producer started before a failed connect would be left extracting
+    loader = DatabaseLoader()
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    totals = {'batches' : 0, 'movies' : 0, 'daily_stats' : 0, 'movies_changed' : 0, 'movies_unchanged' : 0,
+              'rows' : {}}
+    try:
+        while True:
+            batch = batches.get()
+            if batch is finished:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            if should_stop and should_stop():
+                # Batches left in the queue are redone by the next run
+                break
+
+            summary = loader.load_all(batch)
+            totals['batches'] += 1
+            totals['movies_changed'] += summary['movies_changed']
+            totals['movies_unchanged'] += summary['movies_unchanged']
+            add_row_counts(totals['rows'], summary['rows'])
+            totals['movies'] += len(batch['movies'])
+            totals['daily_stats'] += len(batch['daily_stats'])
+            if on_batch_loaded:
+                on_batch_loaded(batch, totals)
+
+        # Ranks and averages span the whole snapshot, so they're refreshed once all batches are in
+        loader.refresh_derived()
     finally:
-        loader.close()
\ No newline at end of file
+        stop.set()
+        producer.join()
+        loader.close()
+
+    return totals
\ No newline at end of file
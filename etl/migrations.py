@@ -0,0 +1,297 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+
+# Held for the migration transaction so concurrent cold starts apply each version once
+MIGRATION_LOCK_ID = 7_316_001
+
+# (version, name, SQL). Append new versions, never edit applied ones; every statement is
+# idempotent so a database built by hand from the README converges on the same schema.
+MIGRATIONS = [
+    (1, 'base_schema', """
+        CREATE TABLE IF NOT EXISTS movies (
+            id SERIAL PRIMARY KEY,
+            tmdb_id INTEGER NOT NULL UNIQUE,
+            title VARCHAR(255) NOT NULL,
+            release_date DATE,
+            overview TEXT,
+            poster_path VARCHAR(255),
+            backdrop_path VARCHAR(255),
+            original_language VARCHAR(10),
+            runtime INTEGER,
+            budget BIGINT,
+            revenue BIGINT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS genres (
+            id SERIAL PRIMARY KEY,
+            tmdb_genre_id INTEGER NOT NULL UNIQUE,
+            name VARCHAR(100) NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS movie_genres (
+            movie_id INTEGER NOT NULL REFERENCES movies(id),
+            genre_id INTEGER NOT NULL REFERENCES genres(id),
+            PRIMARY KEY (movie_id, genre_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            id SERIAL PRIMARY KEY,
+            movie_id INTEGER REFERENCES movies(id),
+            date DATE NOT NULL,
+            popularity DECIMAL,
+            vote_average DECIMAL,
+            vote_count INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (movie_id, date)
+        );
+    """),
+    (2, 'query_indexes', """
+        -- Upsert conflict targets and surrogate-key lookups (normally the UNIQUE constraints)
+        CREATE UNIQUE INDEX IF NOT EXISTS movies_tmdb_id_key ON movies (tmdb_id);
+        CREATE UNIQUE INDEX IF NOT EXISTS genres_tmdb_genre_id_key ON genres (tmdb_genre_id);
+        CREATE UNIQUE INDEX IF NOT EXISTS daily_stats_movie_id_date_key ON daily_stats (movie_id, date);
+
+        -- MAX(date), the latest snapshot ordered by popularity (top movies, LIMIT 20),
+        -- the latest-snapshot genre join and the 7-day trend range
+        CREATE INDEX IF NOT EXISTS idx_daily_stats_date_popularity ON daily_stats (date, popularity DESC);
+        DROP INDEX IF EXISTS idx_daily_stats_date;
+
+        -- genre -> movies side of the junction; the primary key covers movie -> genres
+        CREATE INDEX IF NOT EXISTS idx_movie_genres_genre_id ON movie_genres (genre_id);
+    """),
+    (3, 'hourly_stats', """
+        -- Append-only hourly snapshots. Fixed-width columns, widest first so nothing is
+        -- padded; popularity and vote_average are stored exactly as thousandths.
+        CREATE TABLE IF NOT EXISTS hourly_stats (
+            captured_at TIMESTAMP NOT NULL,
+            movie_id INTEGER NOT NULL REFERENCES movies(id) ON DELETE CASCADE,
+            popularity_milli INTEGER,
+            vote_count INTEGER,
+            vote_average_milli SMALLINT
+        );
+
+        -- Rows arrive in captured_at order, so a BRIN index stays tiny and still prunes
+        CREATE INDEX IF NOT EXISTS idx_hourly_stats_captured_at
+            ON hourly_stats USING brin (captured_at) WITH (pages_per_range = 32);
+
+        -- Intra-day range and snapshot count, filled in by the hourly rollup
+        ALTER TABLE daily_stats ADD COLUMN IF NOT EXISTS popularity_high DECIMAL;
+        ALTER TABLE daily_stats ADD COLUMN IF NOT EXISTS popularity_low DECIMAL;
+        ALTER TABLE daily_stats ADD COLUMN IF NOT EXISTS hourly_snapshots SMALLINT;
+    """),
+    (4, 'dashboard_aggregates', """
+        -- Per-snapshot rollups the dashboard reads instead of joining daily_stats;
+        -- date leads both keys for the MAX(date) and date-range lookups
+        CREATE TABLE IF NOT EXISTS genre_daily_stats (
+            date DATE NOT NULL,
+            genre_id INTEGER NOT NULL REFERENCES genres(id) ON DELETE CASCADE,
+            movie_count INTEGER NOT NULL,
+            avg_popularity DECIMAL,
+            avg_vote_average DECIMAL,
+            PRIMARY KEY (date, genre_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS daily_summary (
+            date DATE PRIMARY KEY,
+            movie_count INTEGER NOT NULL,
+            avg_popularity DECIMAL,
+            avg_rating DECIMAL
+        );
+    """),
+    (5, 'loader_tables', """
+        -- Tables the loader used to create on first use
+
+        -- Sub-resources fetched via append_to_response
+        CREATE TABLE IF NOT EXISTS movie_credits (
+            movie_id INTEGER NOT NULL REFERENCES movies(id) ON DELETE CASCADE,
+            tmdb_person_id INTEGER NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            credit_type VARCHAR(10) NOT NULL,
+            role VARCHAR(500) NOT NULL,
+            credit_order INTEGER,
+            PRIMARY KEY (movie_id, tmdb_person_id, credit_type, role)
+        );
+
+        CREATE TABLE IF NOT EXISTS movie_release_dates (
+            movie_id INTEGER NOT NULL REFERENCES movies(id) ON DELETE CASCADE,
+            country CHAR(2) NOT NULL,
+            release_type SMALLINT NOT NULL,
+            release_date DATE NOT NULL,
+            certification VARCHAR(20),
+            PRIMARY KEY (movie_id, country, release_type, release_date)
+        );
+
+        CREATE TABLE IF NOT EXISTS movie_keywords (
+            movie_id INTEGER NOT NULL REFERENCES movies(id) ON DELETE CASCADE,
+            tmdb_keyword_id INTEGER NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            PRIMARY KEY (movie_id, tmdb_keyword_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS movie_external_ids (
+            movie_id INTEGER PRIMARY KEY REFERENCES movies(id) ON DELETE CASCADE,
+            imdb_id VARCHAR(20),
+            wikidata_id VARCHAR(20),
+            facebook_id VARCHAR(255),
+            instagram_id VARCHAR(255),
+            twitter_id VARCHAR(255)
+        );
+
+        -- Content fingerprints of the last loaded version of each movie
+        CREATE TABLE IF NOT EXISTS movie_fingerprints (
+            tmdb_id INTEGER PRIMARY KEY,
+            fingerprint CHAR(40) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        -- Derived per-movie, per-snapshot metrics, filled from daily_stats after each load
+        CREATE TABLE IF NOT EXISTS movie_metrics (
+            movie_id INTEGER NOT NULL REFERENCES movies(id) ON DELETE CASCADE,
+            date DATE NOT NULL,
+            profit BIGINT,
+            roi NUMERIC(12, 4),
+            popularity_rank INTEGER NOT NULL,
+            previous_date DATE,
+            popularity_delta DECIMAL(10,3),
+            vote_count_delta INTEGER,
+            rank_change INTEGER,
+            PRIMARY KEY (movie_id, date)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_movie_metrics_date ON movie_metrics (date);
+    """),
+    (6, 'hourly_stats_unique', """
+        -- One snapshot per movie and hour, so retried or replayed loads can't add duplicates.
+        -- Duplicates already there keep the earliest snapshot of their hour.
+        DELETE FROM hourly_stats h
+        USING hourly_stats d
+        WHERE d.movie_id = h.movie_id
+          AND date_trunc('hour', d.captured_at) = date_trunc('hour', h.captured_at)
+          AND (d.captured_at, d.ctid) < (h.captured_at, h.ctid);
+
+        CREATE UNIQUE INDEX IF NOT EXISTS hourly_stats_movie_id_hour_key
+            ON hourly_stats (movie_id, date_trunc('hour', captured_at));
+    """),
+    (7, 'movie_metrics_unbounded_roi', """
+        -- TMDB has placeholder budgets (budget = 1 next to real revenue) whose ROI
+        -- overflows NUMERIC(12, 4) and would fail the whole metrics refresh
+        ALTER TABLE movie_metrics ALTER COLUMN roi TYPE NUMERIC;
+    """),
+]
+
+def apply_migrations(connection, migrations=MIGRATIONS):
+    '''Apply the versions not yet recorded in schema_migrations, in one transaction'''
+    cursor = connection.cursor()
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS schema_migrations (
+               version INTEGER PRIMARY KEY,
+               name VARCHAR(100) NOT NULL,
+               applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           )"""
+    )
+    cursor.execute("SELECT version FROM schema_migrations")
+    done = {row[0] for row in cursor.fetchall()}
+
+    applied = []
+    for version, name, sql in migrations:
+        if version in done:
+            continue
+        cursor.execute(sql)
+        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        applied.append(version)
+    connection.commit()
+
+    if applied:
+        print(f"Applied schema migrations {applied}")
+    return applied
+
+schema_current = False
+
+def ensure_schema(connection):
+    '''apply_migrations once per process; warm invocations skip the check'''
+    global schema_current
+    if not schema_current:
+        apply_migrations(connection)
+        schema_current = True
+
+def seq_scans(plan):
+    '''Yield (relation, estimated rows) for every Seq Scan node in an EXPLAIN JSON plan'''
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan['Relation Name'], plan['Plan Rows']
+    for child in plan.get('Plans', []):
+        yield from seq_scans(child)
+
+def explain_seq_scans(connection, queries):
+    '''Report the sequential scans in the plans of `queries`
+
+    On small tables the planner prefers a Seq Scan even with a usable index, so
+    each query is planned again with seq scans disabled: scans that remain have
+    no index to fall back on.
+    '''
+    cursor = connection.cursor()
+    report = []
+    try:
+        for name, query in queries.items():
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query)
+            scans = list(seq_scans(cursor.fetchone()[0][0]['Plan']))
+            if not scans:
+                continue
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query)
+            unindexed = {relation for relation, _ in seq_scans(cursor.fetchone()[0][0]['Plan'])}
+            cursor.execute("RESET enable_seqscan")
+            for relation, rows in scans:
+                report.append({'query' : name, 'relation' : relation, 'estimated_rows' : rows,
+                               'has_index' : relation not in unindexed})
+    finally:
+        connection.rollback()
+    return report
+
+def check_dashboard_queries(connection):
+    '''EXPLAIN the dashboard's queries and print any sequential scans'''
+    try:
+        from dashboard.queries import DASHBOARD_QUERIES
+    except ImportError:
+        # The Lambda bundle ships etl/ only; run `python etl/migrations.py` from a checkout instead
+        print("Skipping the dashboard query check: dashboard.queries is not available")
+        return None
+
+    report = explain_seq_scans(connection, DASHBOARD_QUERIES)
+    for scan in report:
+        hint = 'index available' if scan['has_index'] else 'NO usable index'
+        print(f"⚠️ {scan['query']}: Seq Scan on {scan['relation']} "
+              f"(~{scan['estimated_rows']} rows, {hint})")
+    if not report:
+        print("✅ No sequential scans in the dashboard queries")
+    return report
+
+def migrate(check=True):
+    '''Apply pending migrations and optionally EXPLAIN the dashboard queries'''
+    from load import DatabaseLoader
+
+    loader = DatabaseLoader()
+    try:
+        # The loader has normally applied them already
+        apply_migrations(loader.connection)
+        cursor = loader.connection.cursor()
+        cursor.execute("SELECT MAX(version) FROM schema_migrations")
+        result = {'schema_version' : cursor.fetchone()[0]}
+        loader.connection.commit()
+        if check:
+            result['seq_scans'] = check_dashboard_queries(loader.connection)
+        return result
+    finally:
+        loader.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Apply schema migrations and check dashboard query plans')
+    parser.add_argument('--no-check', action='store_true', help='skip the EXPLAIN check')
+    args = parser.parse_args()
+    print(json.dumps(migrate(check=not args.no_check), indent=2))
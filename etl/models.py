@@ -0,0 +1,162 @@
+import json
+from typing import List, Union
+
+try:
+    import msgspec
+    from msgspec import UNSET, UnsetType
+    Struct = msgspec.Struct
+except ImportError:
+    msgspec = None
+    UNSET, UnsetType = None, type(None)
+    Struct = object
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# Only top-billed cast and key crew are kept from the credits sub-resource
+CAST_LIMIT = 10
+CREW_JOBS = {'Director', 'Screenplay', 'Writer', 'Producer', 'Original Music Composer'}
+
+# Sub-resources fetched via append_to_response, each loaded into its own table
+SUB_RESOURCES = ('credits', 'release_dates', 'keywords', 'external_ids')
+
+class Record(Struct):
+    '''Typed TMDB payload holding only the fields the pipeline reads
+
+    Records answer the same `get`, `[]` and `in` lookups as decoded dicts so the
+    transformers take either. As in a dict, a null field is None and only a
+    missing (UNSET) one falls back to the default.
+    '''
+    def get(self, name, default=None):
+        value = getattr(self, name, UNSET)
+        return default if value is UNSET else value
+
+    def __getitem__(self, name):
+        value = getattr(self, name, UNSET)
+        if value is UNSET:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name):
+        return getattr(self, name, UNSET) is not UNSET
+
+
+class Genre(Record):
+    id: int
+    name: str = ''
+
+class CastMember(Record):
+    id: int
+    name: Union[str, None, UnsetType] = UNSET
+    character: Union[str, None, UnsetType] = UNSET
+    order: Union[int, None, UnsetType] = UNSET
+
+class CrewMember(Record):
+    id: int
+    name: Union[str, None, UnsetType] = UNSET
+    job: Union[str, None, UnsetType] = UNSET
+
+class Credits(Record):
+    cast: List[CastMember] = []
+    crew: List[CrewMember] = []
+
+    def __post_init__(self):
+        # The full cast and crew are most of a detail payload; keep what gets loaded
+        self.cast = self.cast[:CAST_LIMIT]
+        self.crew = [member for member in self.crew if member.job in CREW_JOBS]
+
+class Release(Record):
+    type: Union[int, None, UnsetType] = UNSET
+    release_date: Union[str, None, UnsetType] = UNSET
+    certification: Union[str, None, UnsetType] = UNSET
+
+class CountryReleases(Record):
+    iso_3166_1: str
+    release_dates: List[Release] = []
+
+class ReleaseDates(Record):
+    results: List[CountryReleases] = []
+
+class Keyword(Record):
+    id: int
+    name: Union[str, None, UnsetType] = UNSET
+
+class Keywords(Record):
+    keywords: List[Keyword] = []
+
+class ExternalIds(Record):
+    imdb_id: Union[str, None, UnsetType] = UNSET
+    wikidata_id: Union[str, None, UnsetType] = UNSET
+    facebook_id: Union[str, None, UnsetType] = UNSET
+    instagram_id: Union[str, None, UnsetType] = UNSET
+    twitter_id: Union[str, None, UnsetType] = UNSET
+
+class PopularMovie(Record):
+    '''Entry of /movie/popular; only its stats are loaded'''
+    id: int
+    title: Union[str, None, UnsetType] = UNSET
+    release_date: Union[str, None, UnsetType] = UNSET
+    popularity: Union[float, None, UnsetType] = UNSET
+    vote_average: Union[float, None, UnsetType] = UNSET
+    vote_count: Union[int, None, UnsetType] = UNSET
+    stats_only: bool = False
+
+class PopularPage(Record):
+    results: List[PopularMovie] = []
+    total_pages: int = 1
+
+class MovieDetails(Record):
+    '''/movie/{id} payload with its append_to_response sub-resources'''
+    id: int
+    title: Union[str, None, UnsetType] = UNSET
+    release_date: Union[str, None, UnsetType] = UNSET
+    overview: Union[str, None, UnsetType] = UNSET
+    poster_path: Union[str, None, UnsetType] = UNSET
+    backdrop_path: Union[str, None, UnsetType] = UNSET
+    original_language: Union[str, None, UnsetType] = UNSET
+    runtime: Union[int, None, UnsetType] = UNSET
+    budget: Union[int, None, UnsetType] = UNSET
+    revenue: Union[int, None, UnsetType] = UNSET
+    popularity: Union[float, None, UnsetType] = UNSET
+    vote_average: Union[float, None, UnsetType] = UNSET
+    vote_count: Union[int, None, UnsetType] = UNSET
+    genres: List[Genre] = []
+    credits: Union[Credits, None, UnsetType] = UNSET
+    release_dates: Union[ReleaseDates, None, UnsetType] = UNSET
+    keywords: Union[Keywords, None, UnsetType] = UNSET
+    external_ids: Union[ExternalIds, None, UnsetType] = UNSET
+
+decoders = {}
+
+def decode(body, record_type):
+    '''Decode a JSON response body straight into a record'''
+    if record_type not in decoders:
+        decoders[record_type] = msgspec.json.Decoder(record_type)
+    return decoders[record_type].decode(body)
+
+def mark_stats_only(movie):
+    '''Copy of a popular-list entry flagged to load only its daily stats'''
+    if isinstance(movie, Record):
+        return msgspec.structs.replace(movie, stats_only=True)
+    return dict(movie, stats_only=True)
+
+def movie_content(movie):
+    '''Plain-data view of a detail payload for hashing, the same for a dict or a record'''
+    if msgspec is None:
+        return movie
+    if not isinstance(movie, MovieDetails):
+        try:
+            movie = msgspec.convert(movie, MovieDetails)
+        except msgspec.ValidationError:
+            # Payloads that didn't fit the record are hashed as they came
+            return movie
+    return msgspec.to_builtins(movie)
+
+def json_default(value):
+    '''json.dumps hook: records become dicts, anything else (dates) a string'''
+    if isinstance(value, Record):
+        return msgspec.to_builtins(value)
+    return str(value)
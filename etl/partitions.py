@@ -0,0 +1,278 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gzip
+import io
+import json
+from datetime import date
+from config.config import (
+    DAILY_STATS_PARTITIONS_AHEAD, DAILY_STATS_RETENTION_MONTHS, DAILY_STATS_ARCHIVE_PREFIX
+)
+
+# daily_stats as a monthly range-partitioned table; unique keys must include the partition key
+PARTITIONED_TABLE_DDL = """
+    CREATE SEQUENCE IF NOT EXISTS daily_stats_id_seq;
+
+    CREATE TABLE daily_stats (
+        id INTEGER NOT NULL DEFAULT nextval('daily_stats_id_seq'),
+        movie_id INTEGER REFERENCES movies(id),
+        date DATE NOT NULL,
+        popularity DECIMAL,
+        vote_average DECIMAL,
+        vote_count INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        popularity_high DECIMAL,
+        popularity_low DECIMAL,
+        hourly_snapshots SMALLINT,
+        PRIMARY KEY (id, date),
+        UNIQUE (movie_id, date)
+    ) PARTITION BY RANGE (date);
+
+    CREATE INDEX IF NOT EXISTS idx_daily_stats_date_popularity ON daily_stats (date, popularity DESC);
+
+    ALTER SEQUENCE daily_stats_id_seq OWNED BY daily_stats.id;
+"""
+
+PARTITION_PREFIX = 'daily_stats_p'
+
+def as_date(day):
+    '''A date from a date or, after a JSON round trip (fan-out workers), an ISO string'''
+    return date.fromisoformat(day) if isinstance(day, str) else day
+
+def month_start(day):
+    return as_date(day).replace(day=1)
+
+def add_months(day, months):
+    '''First day of the month `months` after the month of `day`'''
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+def partition_month(name):
+    return date(int(name[-6:-2]), int(name[-2:]), 1)
+
+class DailyStatsPartitions:
+    '''Monthly range partitions of daily_stats: creation ahead of need, migration and retention'''
+    def __init__(self, connection, months_ahead=DAILY_STATS_PARTITIONS_AHEAD):
+        self.connection = connection
+        self.months_ahead = months_ahead
+        self.months = None
+
+    @classmethod
+    def detect(cls, connection):
+        '''Manager for a daily_stats that is already partitioned, else None
+
+        Once the table is partitioned every loader has to create the months it
+        writes, whether or not DAILY_STATS_PARTITIONING is set.
+        '''
+        partitions = cls(connection)
+        return partitions if partitions.state() == 'partitioned' else None
+
+    def state(self):
+        ''''partitioned', 'plain' (the original heap) or None when daily_stats doesn't exist'''
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('daily_stats')")
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return 'partitioned' if row[0] == 'p' else 'plain'
+
+    def attached_months(self):
+        cursor = self.connection.cursor()
+        cursor.execute(
+            """SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+               WHERE i.inhparent = 'daily_stats'::regclass"""
+        )
+        return {partition_month(name) for (name,) in cursor.fetchall() if name.startswith(PARTITION_PREFIX)}
+
+    def create_partition(self, month):
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"""CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF daily_stats
+                FOR VALUES FROM (%s) TO (%s)""",
+            (month, add_months(month, 1))
+        )
+        self.months.add(month)
+
+    def ensure(self, dates):
+        '''Create the partitions for `dates` and the next `months_ahead` months, in the caller's transaction'''
+        if not dates:
+            return
+        if self.months is None:
+            if self.state() != 'partitioned':
+                self.migrate()
+            self.months = self.attached_months()
+
+        # Months ahead count from the current month, so replaying old days doesn't add any
+        wanted = {month_start(day) for day in dates}
+        latest = max(max(wanted), month_start(date.today()))
+        wanted.update(add_months(latest, ahead) for ahead in range(1, self.months_ahead + 1))
+        for month in sorted(wanted - self.months):
+            self.create_partition(month)
+            print(f"Created partition {partition_name(month)}")
+
+    def migrate(self):
+        '''Turn an existing daily_stats heap into a partitioned table, moving its rows across
+
+        Runs in one transaction: readers see either the old table or the new one.
+        The old table's indexes and constraints are renamed out of the way first so
+        the new table gets the usual names.
+        '''
+        cursor = self.connection.cursor()
+        existing = self.state()
+        if existing == 'partitioned':
+            return
+
+        self.months = set()
+        if existing is None:
+            cursor.execute(PARTITIONED_TABLE_DDL)
+            self.connection.commit()
+            print("Created partitioned daily_stats")
+            return
+
+        cursor.execute("LOCK TABLE daily_stats IN ACCESS EXCLUSIVE MODE")
+        cursor.execute("ALTER TABLE daily_stats RENAME TO daily_stats_unpartitioned")
+        cursor.execute(
+            """SELECT conname FROM pg_constraint
+               WHERE conrelid = 'daily_stats_unpartitioned'::regclass AND conname LIKE 'daily_stats%'"""
+        )
+        for (name,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE daily_stats_unpartitioned RENAME CONSTRAINT {name} "
+                           f"TO {name.replace('daily_stats', 'daily_stats_unpartitioned', 1)}")
+        cursor.execute(
+            """SELECT indexname FROM pg_indexes
+               WHERE tablename = 'daily_stats_unpartitioned' AND indexname LIKE '%daily_stats%'
+                 AND indexname NOT LIKE '%unpartitioned%'"""
+        )
+        for (name,) in cursor.fetchall():
+            cursor.execute(f"ALTER INDEX {name} RENAME TO {name.replace('daily_stats', 'daily_stats_unpartitioned', 1)}")
+
+        # Keep the id sequence when the old table is dropped
+        cursor.execute("SELECT pg_get_serial_sequence('daily_stats_unpartitioned', 'id')")
+        sequence = cursor.fetchone()[0]
+        if sequence:
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+            if sequence.split('.')[-1] != 'daily_stats_id_seq':
+                cursor.execute(f"ALTER SEQUENCE {sequence} RENAME TO daily_stats_id_seq")
+        cursor.execute(PARTITIONED_TABLE_DDL)
+
+        cursor.execute("SELECT MIN(date), MAX(date) FROM daily_stats_unpartitioned")
+        first, last = cursor.fetchone()
+        if first is not None:
+            month = month_start(first)
+            while month <= last:
+                self.create_partition(month)
+                month = add_months(month, 1)
+
+        # Columns the old table has (a database behind on migrations may lack some)
+        cursor.execute(
+            """SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum)
+               FROM pg_attribute a
+               JOIN pg_attribute n ON n.attrelid = 'daily_stats'::regclass AND n.attname = a.attname
+               WHERE a.attrelid = 'daily_stats_unpartitioned'::regclass AND a.attnum > 0
+                 AND NOT a.attisdropped AND NOT n.attisdropped"""
+        )
+        columns = cursor.fetchone()[0]
+        cursor.execute(f"INSERT INTO daily_stats ({columns}) SELECT {columns} FROM daily_stats_unpartitioned")
+        moved = cursor.rowcount
+        cursor.execute("SELECT setval('daily_stats_id_seq', GREATEST((SELECT MAX(id) FROM daily_stats), 1))")
+        cursor.execute("DROP TABLE daily_stats_unpartitioned")
+        cursor.execute("ANALYZE daily_stats")
+        self.connection.commit()
+        print(f"Migrated {moved} daily_stats rows into {len(self.months)} monthly partitions")
+
+    def archive(self, store, table, month):
+        '''Write a partition's rows as gzip NDJSON in the transformer's daily_stats shape'''
+        cursor = self.connection.cursor(name=f"archive_{table}")
+        cursor.itersize = 10000
+        cursor.execute(
+            f"""SELECT m.tmdb_id, ds.date, ds.popularity::float8, ds.vote_average::float8, ds.vote_count
+                FROM {table} ds JOIN movies m ON m.id = ds.movie_id
+                ORDER BY ds.date, m.tmdb_id"""
+        )
+
+        buffer = io.BytesIO()
+        rows = 0
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as archive:
+            for tmdb_id, day, popularity, vote_average, vote_count in cursor:
+                record = {'tmdb_movie_id' : tmdb_id, 'date' : day.isoformat(), 'popularity' : popularity,
+                          'vote_average' : vote_average, 'vote_count' : vote_count}
+                archive.write(json.dumps(record).encode('utf-8') + b'\n')
+                rows += 1
+        cursor.close()
+
+        key = f"{DAILY_STATS_ARCHIVE_PREFIX}/month={month:%Y-%m}/daily_stats.ndjson.gz"
+        store.write(key, buffer.getvalue())
+        return key, rows
+
+    def apply_retention(self, store, keep_months=DAILY_STATS_RETENTION_MONTHS, today=None):
+        '''Detach, archive and drop partitions entirely older than `keep_months` months
+
+        A partition that was detached but not yet archived (an interrupted run) is
+        picked up again, so retention can simply be rerun.
+        '''
+        if keep_months <= 0 or self.state() != 'partitioned':
+            return []
+
+        cutoff = add_months(month_start(today or date.today()), -keep_months)
+        cursor = self.connection.cursor()
+        for month in sorted(self.attached_months()):
+            if month < cutoff:
+                cursor.execute(f"ALTER TABLE daily_stats DETACH PARTITION {partition_name(month)}")
+        self.connection.commit()
+        self.months = None
+
+        # Every daily_stats_pYYYYMM table no longer attached is waiting to be archived
+        cursor.execute(
+            """SELECT c.relname FROM pg_class c
+               WHERE c.relkind = 'r' AND c.relname LIKE 'daily\\_stats\\_p______'
+                 AND NOT c.relispartition
+               ORDER BY c.relname"""
+        )
+        archived = []
+        for (table,) in cursor.fetchall():
+            month = partition_month(table)
+            key, rows = self.archive(store, table, month)
+            cursor.execute(f"DROP TABLE {table}")
+            self.connection.commit()
+            print(f"Archived {rows} rows of {table} to {key}")
+            archived.append({'partition' : table, 'rows' : rows, 'key' : key})
+        return archived
+
+def apply_retention(keep_months=DAILY_STATS_RETENTION_MONTHS, store=None):
+    '''Archive and drop the daily_stats partitions past the retention window'''
+    from load import DatabaseLoader
+    from raw_store import open_raw_store
+
+    loader = DatabaseLoader()
+    try:
+        return DailyStatsPartitions(loader.connection).apply_retention(store or open_raw_store(), keep_months)
+    finally:
+        loader.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Manage the monthly partitions of daily_stats')
+    parser.add_argument('command', choices=['migrate', 'retention'])
+    parser.add_argument('--keep-months', type=int, default=DAILY_STATS_RETENTION_MONTHS,
+                        help='months of partitions to keep (retention)')
+    parser.add_argument('--local-dir', help='directory standing in for the S3 bucket')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        from load import DatabaseLoader
+        loader = DatabaseLoader()
+        try:
+            partitions = DailyStatsPartitions(loader.connection)
+            partitions.migrate()
+            partitions.ensure([date.today()])
+            loader.connection.commit()
+        finally:
+            loader.close()
+    else:
+        from raw_store import open_raw_store
+        store = open_raw_store(args.local_dir) if args.local_dir else None
+        apply_retention(args.keep_months, store)
@@ -0,0 +1,98 @@
+import gzip
+import json
+import os
+import boto3
+from config.config import S3_BUCKET, RAW_LOCAL_DIR
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+class S3RawStore:
+    '''Raw and compacted zone objects in the S3 bucket'''
+    def __init__(self, bucket=S3_BUCKET):
+        self.bucket = bucket
+        self.s3_client = boto3.client('s3')
+
+    def list_keys(self, prefix):
+        '''Yield every key under a prefix in lexical order'''
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key']
+
+    def read(self, key):
+        return self.s3_client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+
+    def write(self, key, data):
+        self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def delete(self, key):
+        self.s3_client.delete_object(Bucket=self.bucket, Key=key)
+
+    def exists(self, key):
+        try:
+            self.s3_client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except self.s3_client.exceptions.ClientError:
+            return False
+
+
+class LocalRawStore:
+    '''Directory stand-in for the S3 bucket; keys are paths relative to the root'''
+    def __init__(self, root=RAW_LOCAL_DIR):
+        self.root = root
+
+    def list_keys(self, prefix):
+        '''Yield every key under a prefix in lexical order'''
+        keys = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                key = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    keys.append(key)
+        yield from sorted(keys)
+
+    def read(self, key):
+        with open(os.path.join(self.root, key), 'rb') as f:
+            return f.read()
+
+    def write(self, key, data):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def delete(self, key):
+        path = os.path.join(self.root, key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def exists(self, key):
+        return os.path.exists(os.path.join(self.root, key))
+
+
+def open_raw_store(local_dir=RAW_LOCAL_DIR):
+    '''Use the local directory stand-in when one is configured, S3 otherwise'''
+    return LocalRawStore(local_dir) if local_dir else S3RawStore()
+
+def is_raw_archive(key):
+    return key.endswith(('.ndjson.gz', '.ndjson.zst', '.json'))
+
+def is_crawl_archive(key):
+    '''Raw object written by the catalog crawler (see crawl.py), whose stats aren't loaded'''
+    return key.rsplit('/', 1)[-1].startswith('crawl_')
+
+def decode_records(key, data):
+    '''Parse a raw archive object (gzip/zstd NDJSON or a legacy JSON array)'''
+    if key.endswith('.ndjson.gz'):
+        data = gzip.decompress(data)
+    elif key.endswith('.ndjson.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {key}")
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    else:
+        return json.loads(data)
+
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
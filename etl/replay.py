@@ -0,0 +1,130 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from config.config import RAW_ARCHIVE_PREFIX, RAW_LOCAL_DIR
+from raw_store import open_raw_store, is_raw_archive, is_crawl_archive, decode_records
+from transform import transform_data
+from load import DatabaseLoader
+
+LEGACY_KEY_PATTERN = re.compile(r'movies_detailed_(\d{8})_\d{6}')
+RUN_TIMESTAMP_PATTERN = re.compile(r'movies_detailed_(\d{8}_\d{6})')
+PARTITION_KEY_PATTERN = re.compile(r'/dt=(\d{4}-\d{2}-\d{2})/')
+
+# Each worker process opens its own store (boto3 clients can't be shared across processes)
+worker_store = None
+
+def init_worker(local_dir):
+    global worker_store
+    worker_store = open_raw_store(local_dir)
+
+def snapshot_date_for_key(key):
+    '''Date a raw object was captured, from its dt= partition or legacy timestamped name'''
+    match = PARTITION_KEY_PATTERN.search(key)
+    if match:
+        return date.fromisoformat(match.group(1))
+    match = LEGACY_KEY_PATTERN.search(key)
+    if match:
+        stamp = match.group(1)
+        return date(int(stamp[:4]), int(stamp[4:6]), int(stamp[6:]))
+    return None
+
+def captured_at_for_key(key):
+    '''When the run that wrote a raw object started, from the timestamp in its name'''
+    match = RUN_TIMESTAMP_PATTERN.search(key)
+    return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S') if match else None
+
+def transform_object(key):
+    '''Worker: read, decode and transform one raw object with its historical date'''
+    records = decode_records(key, worker_store.read(key))
+    transformed = transform_data(records, snapshot_date=snapshot_date_for_key(key))
+    # Today's stats go to hourly_stats, which keeps them under their original capture time
+    transformed['captured_at'] = captured_at_for_key(key)
+    if is_crawl_archive(key):
+        # As when crawled: catalog movies don't add to the day's snapshot
+        transformed['daily_stats'] = []
+    return key, transformed
+
+class ReplayCheckpoint:
+    '''Local JSON file of raw objects that have already been loaded'''
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.done = set(json.load(f)['loaded_keys'])
+
+    def mark(self, key):
+        self.done.add(key)
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'loaded_keys' : sorted(self.done)}, f)
+        os.replace(tmp_path, self.path)
+
+def list_raw_objects(store, start_date, end_date):
+    '''Raw archive keys captured between two dates, oldest first'''
+    keys = []
+
+    day = start_date
+    while day <= end_date:
+        keys.extend(k for k in store.list_keys(f"{RAW_ARCHIVE_PREFIX}/dt={day.isoformat()}/")
+                    if is_raw_archive(k))
+        day += timedelta(days=1)
+
+    # Objects written before the archive was partitioned
+    for key in store.list_keys(f"{RAW_ARCHIVE_PREFIX}/movies_detailed_"):
+        snapshot_date = snapshot_date_for_key(key)
+        if is_raw_archive(key) and snapshot_date and start_date <= snapshot_date <= end_date:
+            keys.append(key)
+
+    # Later snapshots must be loaded last so they win the upserts
+    return sorted(keys, key=lambda k: (snapshot_date_for_key(k), k))
+
+def replay_data(start_date, end_date, local_dir=RAW_LOCAL_DIR, workers=None,
+                checkpoint_path='replay_checkpoint.json'):
+    '''Rebuild the database from raw archive objects between two dates'''
+    store = open_raw_store(local_dir)
+    checkpoint = ReplayCheckpoint(checkpoint_path)
+    keys = [k for k in list_raw_objects(store, start_date, end_date) if k not in checkpoint.done]
+    print(f"Replaying {len(keys)} raw objects ({len(checkpoint.done)} already loaded)")
+
+    workers = workers or os.cpu_count()
+    loader = DatabaseLoader()
+    totals = {'objects' : 0, 'movies' : 0, 'daily_stats' : 0}
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(local_dir,)) as executor:
+            # Transform a bounded window ahead of the loader so memory stays flat
+            window = workers * 2
+            for start in range(0, len(keys), window):
+                for key, transformed in executor.map(transform_object, keys[start:start + window]):
+                    loader.load_all(transformed)
+                    checkpoint.mark(key)
+                    totals['objects'] += 1
+                    totals['movies'] += len(transformed['movies'])
+                    totals['daily_stats'] += len(transformed['daily_stats'])
+        loader.refresh_derived()
+    finally:
+        loader.close()
+
+    print(f"Replay finished: {totals}")
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rebuild the database from the raw archive')
+    parser.add_argument('start_date', type=date.fromisoformat)
+    parser.add_argument('end_date', type=date.fromisoformat)
+    parser.add_argument('--local-dir', default=RAW_LOCAL_DIR, help='directory standing in for the S3 bucket')
+    parser.add_argument('--workers', type=int, help='transform processes (default: CPU count)')
+    parser.add_argument('--checkpoint', default='replay_checkpoint.json', help='resume file')
+    args = parser.parse_args()
+
+    replay_data(args.start_date, args.end_date, args.local_dir, args.workers, args.checkpoint)
@@ -1,5 +1,13 @@
+import hashlib
+import json
 import pandas as pd
 from datetime import datetime
+from models import CAST_LIMIT, CREW_JOBS, SUB_RESOURCES, movie_content
+
+# Fields that move every run and are tracked in daily_stats, not the fingerprint.
+# Bump the version when the transform output changes so every movie reloads once.
+VOLATILE_FIELDS = {'popularity', 'vote_average', 'vote_count'}
+FINGERPRINT_VERSION = 2
 
 class MovieDataTransformer:
     def __init__(self):
@@ -10,6 +18,10 @@ class MovieDataTransformer:
         transformed_movies = []
 
         for movie in raw_movies:
+            # Popular-list entries kept only for their daily stats
+            if movie.get('stats_only'):
+                continue
+
             transformed_movie = {
                 'tmdb_id': movie.get('id'),
                 'title': movie.get('title', ''),
@@ -42,10 +54,10 @@ class MovieDataTransformer:
 
         return [{'tmdb_genre_id' : g[0], 'name' : g[1]} for g in genres_set]
     
-    def transform_daily_stats(self, raw_movies):
-        '''Transform Daily statistics'''
+    def transform_daily_stats(self, raw_movies, snapshot_date=None):
+        '''Transform Daily statistics (for today unless a snapshot date is given)'''
         daily_stats = []
-        current_date = datetime.now().date()
+        current_date = snapshot_date or datetime.now().date()
 
         for movie in raw_movies:
             stat = {
@@ -72,15 +84,148 @@ class MovieDataTransformer:
                     })
 
         return movie_genres
+
+    def fingerprint_movies(self, raw_movies):
+        '''Content hash per movie payload, ignoring the per-run stats fields'''
+        fingerprints = []
+
+        for movie in raw_movies:
+            if movie.get('stats_only'):
+                continue
+
+            # Hashed as the trimmed record so a dict and a record of the same payload agree
+            content = {k: v for k, v in movie_content(movie).items() if k not in VOLATILE_FIELDS}
+            payload = json.dumps([FINGERPRINT_VERSION, content], sort_keys=True, default=str)
+            fingerprints.append({
+                'tmdb_id': movie['id'],
+                'fingerprint': hashlib.sha1(payload.encode('utf-8')).hexdigest()
+            })
+
+        return fingerprints
+
+    def transform_credits(self, raw_movies):
+        '''Extract top-billed cast and key crew from appended credits'''
+        credits = []
+
+        for movie in raw_movies:
+            if 'credits' not in movie:
+                continue
+
+            for member in movie['credits'].get('cast', [])[:CAST_LIMIT]:
+                credits.append({
+                    'tmdb_movie_id': movie['id'],
+                    'tmdb_person_id': member['id'],
+                    'name': member.get('name', ''),
+                    'credit_type': 'cast',
+                    'role': member.get('character') or '',
+                    'credit_order': member.get('order')
+                })
+
+            for member in movie['credits'].get('crew', []):
+                if member.get('job') in CREW_JOBS:
+                    credits.append({
+                        'tmdb_movie_id': movie['id'],
+                        'tmdb_person_id': member['id'],
+                        'name': member.get('name', ''),
+                        'credit_type': 'crew',
+                        'role': member['job'],
+                        'credit_order': None
+                    })
+
+        return credits
+
+    def transform_release_dates(self, raw_movies):
+        '''Flatten appended per-country release dates'''
+        release_dates = []
+
+        for movie in raw_movies:
+            if 'release_dates' not in movie:
+                continue
+
+            for country in movie['release_dates'].get('results', []):
+                for release in country.get('release_dates', []):
+                    if not release.get('release_date'):
+                        continue
+                    release_dates.append({
+                        'tmdb_movie_id': movie['id'],
+                        'country': country['iso_3166_1'],
+                        'release_type': release.get('type'),
+                        'release_date': release['release_date'][:10],
+                        'certification': release.get('certification') or None
+                    })
+
+        return release_dates
+
+    def transform_keywords(self, raw_movies):
+        '''Extract appended keywords'''
+        keywords = []
+
+        for movie in raw_movies:
+            if 'keywords' not in movie:
+                continue
+
+            for keyword in movie['keywords'].get('keywords', []):
+                keywords.append({
+                    'tmdb_movie_id': movie['id'],
+                    'tmdb_keyword_id': keyword['id'],
+                    'name': keyword.get('name', '')
+                })
+
+        return keywords
+
+    def transform_external_ids(self, raw_movies):
+        '''Extract appended external IDs (IMDb, Wikidata, socials)'''
+        external_ids = []
+
+        for movie in raw_movies:
+            if 'external_ids' not in movie:
+                continue
+
+            ids = movie['external_ids']
+            external_ids.append({
+                'tmdb_movie_id': movie['id'],
+                'imdb_id': ids.get('imdb_id') or None,
+                'wikidata_id': ids.get('wikidata_id') or None,
+                'facebook_id': ids.get('facebook_id') or None,
+                'instagram_id': ids.get('instagram_id') or None,
+                'twitter_id': ids.get('twitter_id') or None
+            })
+
+        return external_ids
+
+    def list_sub_resources(self, raw_movies):
+        '''Which sub-resources each movie was fetched with, even when they came back empty'''
+        sub_resources = []
+
+        for movie in raw_movies:
+            if movie.get('stats_only'):
+                continue
+
+            for name in SUB_RESOURCES:
+                if name in movie:
+                    sub_resources.append({'tmdb_movie_id': movie['id'], 'sub_resource': name})
+
+        return sub_resources
     
 
-def transform_data(raw_data):
+def transform_data(raw_data, snapshot_date=None):
     '''Main transformaton function'''
     transformer = MovieDataTransformer()
 
     return {
         'movies' : transformer.transform_movies(raw_data),
         'genres' : transformer.transform_genres(raw_data),
-        'daily_stats' : transformer.transform_daily_stats(raw_data),
-        'movie_genres' : transformer.extract_movie_genres(raw_data)
-    }
\ No newline at end of file
+        'daily_stats' : transformer.transform_daily_stats(raw_data, snapshot_date),
+        'movie_genres' : transformer.extract_movie_genres(raw_data),
+        'credits' : transformer.transform_credits(raw_data),
+        'release_dates' : transformer.transform_release_dates(raw_data),
+        'keywords' : transformer.transform_keywords(raw_data),
+        'external_ids' : transformer.transform_external_ids(raw_data),
+        'sub_resources' : transformer.list_sub_resources(raw_data),
+        'fingerprints' : transformer.fingerprint_movies(raw_data)
+    }
+
+def transform_batches(raw_batches, transform=transform_data):
+    '''Transform raw movie batches one at a time as they arrive'''
+    for raw_batch in raw_batches:
+        yield transform(raw_batch)
\ No newline at end of file
@@ -0,0 +1,66 @@
+# Benchmark: execute_values vs COPY staging + merge for large loads
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'etl'))
+
+import time
+from datetime import date
+from load import DatabaseLoader
+from etl_testers.load_benchmark import FIRST_ID, GENRES, fake_data, cleanup
+
+def load_core_tables(loader, movies, movie_genres, stats):
+    timings = {}
+    for table, load, rows in (('movies', loader.load_movies, movies),
+                              ('movie_genres', loader.load_movie_genres, movie_genres),
+                              ('daily_stats', loader.load_daily_stats, stats)):
+        started = time.perf_counter()
+        load(rows)
+        timings[table] = time.perf_counter() - started
+    return timings
+
+def changed(movies, stats):
+    '''Copies with a new title and popularity so every upserted row is a real update'''
+    return ([{**m, 'title': f"{m['title']} (updated)"} for m in movies],
+            [{**s, 'popularity': s['popularity'] + 1} for s in stats])
+
+def row_counts(loader):
+    cursor = loader.connection.cursor()
+    cursor.execute("""SELECT (SELECT COUNT(*) FROM movies WHERE tmdb_id >= %(id)s),
+                             (SELECT COUNT(*) FROM movie_genres mg JOIN movies m ON m.id = mg.movie_id
+                              WHERE m.tmdb_id >= %(id)s),
+                             (SELECT COUNT(*) FROM daily_stats ds JOIN movies m ON m.id = ds.movie_id
+                              WHERE m.tmdb_id >= %(id)s)""", {'id': FIRST_ID})
+    return cursor.fetchone()
+
+def main():
+    loader = DatabaseLoader()
+    try:
+        loader.load_genres([{'tmdb_genre_id': g, 'name': n} for g, n in GENRES])
+        for count in (10_000, 100_000):
+            movies, movie_genres, stats = fake_data(count, date(2000, 1, 1))
+            updated_movies, updated_stats = changed(movies, stats)
+            results = {}
+            for mode, threshold in (('execute_values', float('inf')), ('COPY + merge', 0)):
+                cleanup(loader)
+                loader.copy_threshold = threshold
+                # First pass inserts, second pass changes every movie and stat row
+                # (unchanged rows would be skipped by the IS DISTINCT FROM guards)
+                inserted = load_core_tables(loader, movies, movie_genres, stats)
+                updated = load_core_tables(loader, updated_movies, movie_genres, updated_stats)
+                results[mode] = (inserted, updated, row_counts(loader))
+
+            print(f"📊 {count} movies, {len(movie_genres)} relationships, {len(stats)} stats")
+            for mode, (inserted, updated, counts) in results.items():
+                print(f"   {mode:15} insert {sum(inserted.values()):6.2f} s "
+                      f"({', '.join(f'{t} {s:.2f}' for t, s in inserted.items())})")
+                print(f"   {'':15} upsert {sum(updated.values()):6.2f} s "
+                      f"({', '.join(f'{t} {s:.2f}' for t, s in updated.items())})  rows {counts}")
+            assert len({counts for _, _, counts in results.values()}) == 1
+    finally:
+        cleanup(loader)
+        loader.loaded_dates.clear()
+        loader.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,8 @@
+import sys
+import os
+# etl modules import their siblings directly, as they do inside the Lambda package
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'etl'))
+
 import json
 from etl.extract import extract_data
 from etl.transform import transform_data
@@ -0,0 +1,120 @@
+# Benchmark: per-row (N+1) vs set-based loading of movie_genres and daily_stats
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'etl'))
+
+import time
+from datetime import date
+from psycopg2.extensions import cursor as base_cursor
+from load import DatabaseLoader
+
+# Synthetic movies live far above real TMDB ids and are deleted afterwards
+FIRST_ID = 900_000_000
+GENRES = [(28, 'Action'), (12, 'Adventure'), (35, 'Comedy'), (18, 'Drama'), (27, 'Horror')]
+ASSUMED_RTT_MS = 1.0  # typical Lambda -> RDS round trip in the same region
+
+class CountingCursor(base_cursor):
+    '''Cursor that counts statements sent to the server'''
+    round_trips = 0
+
+    def execute(self, query, vars=None):
+        CountingCursor.round_trips += 1
+        return super().execute(query, vars)
+
+def legacy_load_movie_genres(loader, movie_genres_data):
+    '''load_movie_genres as it was: two lookups and an insert per relationship'''
+    cursor = loader.connection.cursor()
+    for mg in movie_genres_data:
+        cursor.execute("SELECT id FROM movies WHERE tmdb_id = %s", (mg['tmdb_movie_id'],))
+        movie_result = cursor.fetchone()
+        cursor.execute("SELECT id FROM genres WHERE tmdb_genre_id = %s", (mg['tmdb_genre_id'],))
+        genre_result = cursor.fetchone()
+        if movie_result and genre_result:
+            cursor.execute(
+                """INSERT INTO movie_genres (movie_id, genre_id) VALUES (%s, %s)
+                   ON CONFLICT (movie_id, genre_id) DO NOTHING""",
+                (movie_result[0], genre_result[0])
+            )
+    loader.connection.commit()
+
+def legacy_load_daily_stats(loader, stats_data):
+    '''load_daily_stats as it was: a lookup and an upsert per stat'''
+    cursor = loader.connection.cursor()
+    for stat in stats_data:
+        cursor.execute("SELECT id FROM movies WHERE tmdb_id = %s", (stat['tmdb_movie_id'],))
+        movie_result = cursor.fetchone()
+        if movie_result:
+            cursor.execute(
+                """INSERT INTO daily_stats (movie_id, date, popularity, vote_average, vote_count)
+                   VALUES (%s, %s, %s, %s, %s)
+                   ON CONFLICT (movie_id, date)
+                   DO UPDATE SET popularity = EXCLUDED.popularity,
+                                 vote_average = EXCLUDED.vote_average,
+                                 vote_count = EXCLUDED.vote_count""",
+                (movie_result[0], stat['date'], stat['popularity'], stat['vote_average'], stat['vote_count'])
+            )
+    loader.connection.commit()
+
+def fake_data(count, snapshot_date):
+    movies = [{
+        'tmdb_id': FIRST_ID + i, 'title': f"Benchmark {i}", 'release_date': None, 'overview': '',
+        'poster_path': None, 'backdrop_path': None, 'original_language': 'en', 'runtime': 100,
+        'budget': 0, 'revenue': 0
+    } for i in range(count)]
+    movie_genres = [{'tmdb_movie_id': m['tmdb_id'], 'tmdb_genre_id': GENRES[(i + k) % len(GENRES)][0]}
+                    for i, m in enumerate(movies) for k in range(2)]
+    stats = [{'tmdb_movie_id': m['tmdb_id'], 'date': snapshot_date, 'popularity': i % 500,
+              'vote_average': 7.0, 'vote_count': i} for i, m in enumerate(movies)]
+    return movies, movie_genres, stats
+
+def cleanup(loader):
+    cursor = loader.connection.cursor()
+    cursor.execute("DELETE FROM movie_genres WHERE movie_id IN (SELECT id FROM movies WHERE tmdb_id >= %s)", (FIRST_ID,))
+    cursor.execute("DELETE FROM daily_stats WHERE movie_id IN (SELECT id FROM movies WHERE tmdb_id >= %s)", (FIRST_ID,))
+    cursor.execute("DELETE FROM movies WHERE tmdb_id >= %s", (FIRST_ID,))
+    loader.connection.commit()
+
+def measure(fn, *args):
+    CountingCursor.round_trips = 0
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started, CountingCursor.round_trips
+
+def main():
+    loader = DatabaseLoader()
+    loader.connection.cursor_factory = CountingCursor
+    try:
+        loader.load_genres([{'tmdb_genre_id': g, 'name': n} for g, n in GENRES])
+        for count in (100, 1_000, 5_000):
+            movies, movie_genres, stats = fake_data(count, date(2000, 1, 1))
+            cleanup(loader)
+            loader.load_movies(movies)
+
+            results = {
+                'movie_genres N+1': measure(legacy_load_movie_genres, loader, movie_genres),
+                'daily_stats N+1': measure(legacy_load_daily_stats, loader, stats),
+            }
+            cleanup(loader)
+            loader.load_movies(movies)
+            results['movie_genres set-based'] = measure(loader.load_movie_genres, movie_genres)
+            results['daily_stats set-based'] = measure(loader.load_daily_stats, stats)
+
+            # Both paths must leave the same rows behind
+            cursor = loader.connection.cursor()
+            cursor.execute("""SELECT COUNT(*) FROM movie_genres mg JOIN movies m ON m.id = mg.movie_id
+                              WHERE m.tmdb_id >= %s""", (FIRST_ID,))
+            assert cursor.fetchone()[0] == len(movie_genres)
+
+            print(f"📊 {count} movies, {len(movie_genres)} relationships, {len(stats)} stats")
+            for name, (seconds, round_trips) in results.items():
+                projected = seconds + round_trips * ASSUMED_RTT_MS / 1000
+                print(f"   {name:24} {round_trips:6} round trips  {seconds * 1000:8.1f} ms local"
+                      f"  ~{projected:6.2f} s at {ASSUMED_RTT_MS:.0f} ms RTT")
+    finally:
+        cleanup(loader)
+        loader.loaded_dates.clear()
+        loader.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
 # Test Code for Load
 
+import sys
+import os
+# etl modules import their siblings directly, as they do inside the Lambda package
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'etl'))
+
 from etl.load import DatabaseLoader  # adjust if DatabaseLoader is elsewhere
 
 def main():
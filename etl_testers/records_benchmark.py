@@ -0,0 +1,102 @@
+# Benchmark: full response dicts vs slotted TMDB records (decode time and retained memory)
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'etl'))
+
+import gc
+import json
+import random
+import time
+import tracemalloc
+from models import MovieDetails, decode
+from transform import transform_data
+
+JOBS = ['Director', 'Screenplay', 'Producer', 'Editor', 'Casting', 'Grip', 'Gaffer', 'Sound Mixer',
+        'Original Music Composer', 'Costume Design', 'Visual Effects Supervisor']
+
+def person(i):
+    return {
+        'adult': False, 'gender': random.randint(0, 2), 'id': 10_000 + i,
+        'known_for_department': 'Acting', 'name': f"Person {i}", 'original_name': f"Person {i}",
+        'popularity': random.uniform(0, 50), 'profile_path': f"/profile{i}.jpg",
+        'credit_id': f"{random.getrandbits(96):024x}"
+    }
+
+def fake_body(movie_id):
+    '''A /movie/{id}?append_to_response=... body shaped like TMDB's'''
+    body = {
+        'adult': False, 'backdrop_path': f"/backdrop{movie_id}.jpg",
+        'belongs_to_collection': {'id': 1, 'name': 'Collection', 'poster_path': '/c.jpg', 'backdrop_path': '/cb.jpg'},
+        'budget': random.randint(0, 200_000_000),
+        'genres': [{'id': 28, 'name': 'Action'}, {'id': 12, 'name': 'Adventure'}],
+        'homepage': f"https://example.com/{movie_id}", 'id': movie_id, 'imdb_id': f"tt{movie_id:07d}",
+        'origin_country': ['US'], 'original_language': 'en', 'original_title': f"Movie {movie_id}",
+        'overview': 'A long overview of the plot. ' * 12, 'popularity': random.uniform(1, 500),
+        'poster_path': f"/poster{movie_id}.jpg",
+        'production_companies': [{'id': i, 'logo_path': f"/logo{i}.png", 'name': f"Studio {i}",
+                                  'origin_country': 'US'} for i in range(4)],
+        'production_countries': [{'iso_3166_1': 'US', 'name': 'United States of America'}],
+        'release_date': '2024-05-01', 'revenue': random.randint(0, 900_000_000), 'runtime': 120,
+        'spoken_languages': [{'english_name': 'English', 'iso_639_1': 'en', 'name': 'English'}],
+        'status': 'Released', 'tagline': 'A tagline.', 'title': f"Movie {movie_id}", 'video': False,
+        'vote_average': round(random.uniform(1, 10), 3), 'vote_count': random.randint(0, 20000),
+        'credits': {
+            'cast': [dict(person(i), cast_id=i, character=f"Character {i}", order=i) for i in range(40)],
+            'crew': [dict(person(100 + i), department='Crew', job=JOBS[i % len(JOBS)]) for i in range(80)]
+        },
+        'release_dates': {'results': [
+            {'iso_3166_1': f"C{c:01d}", 'release_dates': [
+                {'certification': 'PG-13', 'descriptors': [], 'iso_639_1': '', 'note': '',
+                 'release_date': '2024-05-01T00:00:00.000Z', 'type': t} for t in (1, 3, 4)
+            ]} for c in range(30)
+        ]},
+        'keywords': {'keywords': [{'id': k, 'name': f"keyword {k}"} for k in range(15)]},
+        'external_ids': {'imdb_id': f"tt{movie_id:07d}", 'wikidata_id': f"Q{movie_id}", 'facebook_id': None,
+                         'instagram_id': None, 'twitter_id': None}
+    }
+    if movie_id % 10 == 0:
+        # Unknown values come back as null and must load as NULL from either shape
+        body.update(title=None, overview=None, runtime=None, budget=None, revenue=None,
+                    popularity=None, vote_average=None, vote_count=None)
+    return json.dumps(body).encode('utf-8')
+
+def measure(decode, bodies):
+    '''Decode every body, returning (seconds, bytes still allocated for the decoded movies)'''
+    gc.collect()
+    started = time.perf_counter()
+    movies = [decode(body) for body in bodies]
+    elapsed = time.perf_counter() - started
+    del movies
+
+    # Timed and traced separately: tracemalloc slows every allocation down
+    gc.collect()
+    tracemalloc.start()
+    movies = [decode(body) for body in bodies]
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, retained, movies
+
+def main():
+    count = 2_000
+    bodies = [fake_body(i + 1) for i in range(count)]
+    print(f"📦 {count} detail payloads, {sum(map(len, bodies)) / count / 1024:.1f} KiB of JSON each")
+
+    dict_time, dict_bytes, dict_movies = measure(json.loads, bodies)
+    record_time, record_bytes, record_movies = measure(lambda body: decode(body, MovieDetails), bodies)
+    print(f"   json.loads -> dict:     {dict_time * 1000:8.1f} ms, {dict_bytes / count / 1024:6.1f} KiB per movie")
+    print(f"   msgspec -> record:      {record_time * 1000:8.1f} ms, "
+          f"{record_bytes / count / 1024:6.1f} KiB per movie")
+    print(f"   ⚡ {dict_time / record_time:.1f}x faster, {dict_bytes / record_bytes:.1f}x less memory")
+
+    # Both shapes must transform to the same rows (and fingerprints)
+    snapshot = time.strftime('%Y-%m-%d')
+    from_dicts = transform_data(dict_movies, snapshot)
+    from_records = transform_data(record_movies, snapshot)
+    for table in from_dicts:
+        rows = sorted(map(repr, from_dicts[table])) == sorted(map(repr, from_records[table]))
+        print(f"   {'✅' if rows else '❌'} {table}: {len(from_records[table])} rows")
+
+if __name__ == "__main__":
+    main()